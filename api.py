@@ -1,106 +1,390 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError, wait
 from logging import getLogger
-import json
-import hashlib
-import hmac
+from threading import local
+from typing import Callable
 import time
+import uuid
 
 import requests
-from requests import status_codes
+from requests.adapters import HTTPAdapter
 
 from constants import MAINNET_API, TESTNET_API
+from cache import TTLCache
+from fastjson import loads
+from metrics import Counter, Histogram
+from ratelimit import RateLimiter
+from signer import Signer, encode
+from transport import HEDGED, HEDGED_PATHS, RETRIES, CircuitBreaker, RetryPolicy, is_transient
 
 
 logger = getLogger(__name__)
 
 
+REQUEST_SECONDS = Histogram('bybit_request_seconds', 'Latency of Bybit REST API requests.', ('method', 'path'))
+API_ERRORS = Counter('bybit_api_errors_total', 'Bybit REST API errors by ret_code, or http_<status>.', ('path', 'ret_code'))
+
+
 class BybitAPIError(Exception):
-    pass
 
+    def __init__(self, msg: str, ret_code: int = None):
+        super().__init__(msg)
+        self.ret_code = ret_code
 
-class ByBit(object):
 
-    def __init__(self, api_key: str, api_secret: str, test: bool = True):
-        self.__api_key = api_key
-        self.__api_secret = api_secret
+class CircuitOpenError(BybitAPIError):
+    '''
+    Raised without sending the request while the circuit of the endpoint is open.
+    '''
+
+
+class ByBit(object):
+    '''
+    Base client of Bybit REST API.
+
+    All requests are sent through one keep-alive session, so connections
+    to the api host are pooled and reused by every thread sharing the client.
+
+    Parameters
+    ----------
+    base_url: str
+        base url of the api overriding mainnet/testnet, e.g. a local mock exchange
+    pool_size: int
+        max number of pooled connections kept alive to the api host
+    connect_timeout: float
+        seconds to wait for establishing a connection
+    read_timeout: float
+        seconds to wait for the response
+    latency_hook: Callable[[str, str, float], None]
+        called with (method, path, elapsed seconds) after each request
+    rate_limiter: RateLimiter
+        paces requests to stay within the rate limits if given
+    cache: TTLCache
+        serves GET responses of the cached paths without requests if given
+    retry: RetryPolicy
+        retries requests failed by a transient error if given. a create
+        is resubmitted only if the order of its order_link_id is not found.
+    breaker: CircuitBreaker
+        fails requests of an endpoint at once while it keeps failing if given
+    hedge_after: float
+        seconds after which a duplicate of a slow read of HEDGED_PATHS is
+        sent, and the first response of the two is used. no duplicate if None.
+    '''
+
+    def __init__(self,
+                 api_key: str,
+                 api_secret: str,
+                 test: bool = True,
+                 base_url: str = None,
+                 pool_size: int = 10,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 5.0,
+                 latency_hook: Callable[[str, str, float], None] = None,
+                 rate_limiter: RateLimiter = None,
+                 cache: TTLCache = None,
+                 retry: RetryPolicy = None,
+                 breaker: CircuitBreaker = None,
+                 hedge_after: float = None):
+        self.__signer = Signer(api_key, api_secret)
         self.__test = test
-        self.__base_url = TESTNET_API if test else MAINNET_API
+        self.__base_url = base_url or (TESTNET_API if test else MAINNET_API)
+        self.__timeout = (connect_timeout, read_timeout)
+        self.__latency_hook = latency_hook
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.retry = retry
+        self.breaker = breaker
+        self.hedge_after = hedge_after
+        self.__local = local()
+        self.__executor = None
+        self.__session = None
+        self._open(pool_size)
+
+    def _open(self, pool_size: int) -> None:
+        '''
+        Create the session and the executor sending the requests.
+        Overridden by subclasses sending them otherwise.
+        '''
+        self.__executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='ByBit')
+        self.__session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.__session.mount('https://', adapter)
+        self.__session.mount('http://', adapter)
 
     def _base_url(self) -> str:
-        return TESTNET_API if self.__test else MAINNET_API
-
-    def _auth_get_parmas(self, params = {}) -> str:
-        param_str = self._sorted_param_str(params)
-        return f'{param_str}&sign={self._sign(param_str)}'
-
-    def _auth_post_data(self, params = {}) -> dict:
-        param_str = self._sorted_param_str(params)
-        params.update({'sign': self._sign(param_str)})
-        return params
-
-    def _sorted_param_str(self, params: dict) -> str:
-        params.update({
-            'api_key': self.__api_key,
-            'timestamp': str(round(time.time() * 1000)),
-        })
-        s = ''
-        for k in sorted(params.keys()):
-            v = params[k]
-            if isinstance(params[k], bool):
-                v = 'true' if v else 'false'
-            s += f"{k}={v}&"
-        return s[:-1]
-
-    def _sign(self, param_str: str) -> str:
-        hash = hmac.new(
-                bytes(self.__api_secret, "utf-8"),
-                param_str.encode("utf-8"), hashlib.sha256)
-        return hash.hexdigest()
-
-    def _handle_response(self, res) -> dict:
+        return self.__base_url
+
+    def _timeout(self) -> tuple:
+        return self.__timeout
+
+    def last_latency(self) -> float:
+        '''
+        Returns
+        -------
+        float
+            seconds taken by the last request sent from the calling thread
+        '''
+        return getattr(self.__local, 'latency', None)
+
+    def close(self) -> None:
+        self.__executor.shutdown(wait=False)
+        self.__session.close()
+
+    def batch(self, calls: list) -> list:
+        '''
+        Send requests concurrently over the pooled session.
+
+        Parameters
+        ----------
+        calls: list
+            (api method, keyword arguments) of each request
+
+        Returns
+        -------
+        list
+            result of each request in the same order, or the exception it raised
+        '''
+        futures = [self.__executor.submit(method, **params) for method, params in calls]
+        return [f.exception() or f.result() for f in futures]
+
+    def _get(self, path: str, params: dict = None, auth: bool = False):
+        key = self.cache.key(path, params, self._base_url()) if self.cache else None
+        if key:
+            result = self.cache.get(key)
+            if result is not None:
+                logger.debug('GET %s (cached)', path)
+                return self._cached(result)
+
+        def send():
+            # signed again on each attempt, as the timestamp must be recent
+            p = ''
+            if auth:
+                p = '?' + self.__signer.request(params).query()
+            elif params:
+                p = '?' + encode(params)
+            url = f'{self._base_url()}{path}{p}'
+            logger.debug('GET %s', url)
+            return self._send('GET', path, url, cache_key=key)
+
+        if self.hedge_after is not None and not auth and path in HEDGED_PATHS:
+            send = self._hedge(path, send)
+        return self._call(path, send)
+
+    def _post(self, path: str, params: dict, recover: Callable = None):
+        '''
+        Parameters
+        ----------
+        recover: Callable
+            called before a retry to get the result of the former attempt
+            which reached the exchange, e.g. the order created. the request is
+            sent again if it returns nothing or raises a non transient error.
+        '''
+        headers = {"Content-Type": "application/json"}
+        url = f'{self._base_url()}{path}'
+
+        def send():
+            payload = self.__signer.request(params).body()
+            logger.debug('POST %s %s', url, payload)
+            return self._send('POST', path, url, headers=headers, data=payload)
+
+        return self._call(path, send, recover)
+
+    def _signed(self, method: str, path: str, params: dict = None):
+        '''
+        Send the signed parameters in the query string, which the spot api
+        takes for every method.
+        '''
+        def send():
+            url = f'{self._base_url()}{path}?{self.__signer.request(params).query()}'
+            logger.debug('%s %s', method, url)
+            return self._send(method, path, url)
+
+        # a spot order has no order_link_id given, so only reads are retried
+        return self._call(path, send) if method == 'GET' else self._call(path, send, retry=False)
+
+    def _transient(self, e: Exception) -> bool:
+        return is_transient(e)
+
+    def _call(self, path: str, send: Callable, recover: Callable = None, retry: bool = True):
+        '''
+        Send the request, retrying it after transient errors by the retry
+        policy, through the circuit breaker of the path.
+        '''
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            if self.breaker and not self.breaker.allow(path):
+                self._record_error(path, 'circuit_open')
+                raise CircuitOpenError(f'Circuit of {path} is open.', 'circuit_open')
+            try:
+                result = None
+                if attempt and recover:
+                    try:
+                        result = recover()
+                    except BybitAPIError as e:
+                        if self._transient(e):
+                            raise
+                if not result:
+                    result = send()
+            except Exception as e:
+                delay = self._on_error(path, e, attempt, start, retry)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if self.breaker:
+                self.breaker.success(path)
+            return result
+
+    def _on_error(self, path: str, e: Exception, attempt: int, start: float, retry: bool) -> float:
+        '''
+        Returns
+        -------
+        float
+            seconds to wait before retrying the request. raises the error if
+            it is not retried.
+        '''
+        if not self._transient(e):
+            if self.breaker and isinstance(e, BybitAPIError):
+                self.breaker.success(path)
+            raise e
+        if self.breaker:
+            self.breaker.failure(path)
+        delay = self.retry.next_delay(attempt, time.monotonic() - start) if self.retry and retry else None
+        if delay is None:
+            raise e
+        RETRIES.inc(path)
+        # the error itself is not logged, as its message may hold the signed url
+        logger.warning(f'Retry {path} in {delay:.3f} seconds after a transient error: '
+                       f'{type(e).__name__}, status={_error_status(e)}')
+        return delay
+
+    def _hedge(self, path: str, send: Callable) -> Callable:
+        '''
+        Returns
+        -------
+        Callable
+            sends a duplicate of the request if it takes more than hedge_after
+            seconds, and returns the first successful response of the two
+        '''
+        def timed():
+            # the latency is kept by the thread of the executor which sent the request
+            result = send()
+            return result, self.last_latency()
+
+        def won(f):
+            result, self.__local.latency = f.result()
+            return result
+
+        def hedged():
+            first = self.__executor.submit(timed)
+            try:
+                first.result(timeout=self.hedge_after)
+                return won(first)
+            except TimeoutError:
+                pass
+            HEDGED.inc(path)
+            pending = {first, self.__executor.submit(timed)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    if not f.exception():
+                        return won(f)
+            return won(f)
+
+        return hedged
+
+    def _send(self, method: str, path: str, url: str, cache_key: tuple = None, **kwargs):
+        if self.rate_limiter:
+            self.rate_limiter.acquire(path)
+        start = time.perf_counter()
+        res = self.__session.request(method, url, timeout=self.__timeout, **kwargs)
+        self._record_latency(method, path, time.perf_counter() - start)
+        result = self._handle_response(res, path)
+        if cache_key:
+            self.cache.set(cache_key, result)
+        return result
+
+    def _cached(self, result):
+        return result
+
+    def _record_latency(self, method: str, path: str, elapsed: float) -> None:
+        self.__local.latency = elapsed
+        REQUEST_SECONDS.observe(elapsed, method, path)
+        if self.__latency_hook:
+            self.__latency_hook(method, path, elapsed)
+
+    def _record_error(self, path: str, ret_code) -> None:
+        API_ERRORS.inc(path, ret_code)
+
+    def _handle_response(self, res, path: str = None) -> dict:
+        if res.status_code >= 400:
+            self._record_error(path, f'http_{res.status_code}')
         res.raise_for_status()
-        body = json.loads(res.text)
-        logger.debug('Response body: ' + json.dumps(body, indent=True))
+        return self._handle_body(res.content, path)
+
+    def _handle_body(self, content: bytes, path: str = None) -> dict:
+        logger.debug('Response body: %s', content)
+        # parsed from bytes, the json backend decodes utf-8 itself
+        body = loads(content)
+        if self.rate_limiter and path:
+            self.rate_limiter.update(path, body.get('rate_limit_status'), body.get('rate_limit_reset_ms'))
         if body['ret_code'] != 0:
-            raise BybitAPIError(f"Failed to call api: {body}")
+            self._record_error(path, body['ret_code'])
+            raise BybitAPIError(f"Failed to call api: {body}", body['ret_code'])
         return body['result']
 
 
+def _error_status(e: Exception):
+    '''
+    Returns
+    -------
+    object
+        http status or ret_code of the error, or None if it has neither
+    '''
+    response = getattr(e, 'response', None)
+    if response is not None:
+        return response.status_code
+    return getattr(e, 'status', None) or getattr(e, 'ret_code', None)
+
+
 class InversePerp(ByBit):
 
-    def __init__(self, api_key: str, api_secret: str, test: bool = True):
-        super().__init__(api_key, api_secret, test)
+    def __init__(self, api_key: str, api_secret: str, test: bool = True, **kwargs):
+        super().__init__(api_key, api_secret, test, **kwargs)
 
     def private_wallet_balance(self):
-        path = '/v2/private/wallet/balance'
-        url = f'{self._base_url()}{path}?{self._auth_get_parmas()}'
-        logger.debug(f'GET {url}')
-        res = requests.get(url=url)
-        return self._handle_response(res)
-
-    def private_wallet_fund_records(self):
-        path = '/v2/private/wallet/fund/records'
-        url = f'{self._base_url()}{path}?{self._auth_get_parmas()}'
-        logger.debug(f'GET {url}')
-        res = requests.get(url=url)
-        return self._handle_response(res)
+        return self._get('/v2/private/wallet/balance', auth=True)
+
+    def private_wallet_fund_records(self,
+                                    currency: str = None,
+                                    start_date: str = None,
+                                    end_date: str = None,
+                                    wallet_fund_type: str = None,
+                                    page: int = None,
+                                    limit: int = None):
+        params = {}
+        if currency:
+            params.update({'currency': currency})
+        if start_date:
+            params.update({'start_date': start_date})
+        if end_date:
+            params.update({'end_date': end_date})
+        if wallet_fund_type:
+            params.update({'wallet_fund_type': wallet_fund_type})
+        if page:
+            params.update({'page': page})
+        if limit:
+            params.update({'limit': limit})
+        return self._get('/v2/private/wallet/fund/records', params, auth=True)
 
     def private_funding_prevfunding(self, symbol: str):
         params = {'symbol': symbol}
-        path = '/v2/private/funding/prev-funding'
-        url = f'{self._base_url()}{path}?{self._auth_get_parmas(params)}'
-        logger.debug(f'GET {url}')
-        res = requests.get(url=url)
-        return self._handle_response(res)
+        return self._get('/v2/private/funding/prev-funding', params, auth=True)
 
     def private_position_list(self, symbol: str = None):
         params = {}
         if symbol:
             params.update({'symbol': symbol})
-        path = '/v2/private/position/list'
-        url = f'{self._base_url()}{path}?{self._auth_get_parmas(params)}'
-        logger.debug(f'GET {url}')
-        res = requests.get(url=url)
-        return self._handle_response(res)
+        return self._get('/v2/private/position/list', params, auth=True)
 
     def private_order(self, symbol: str, order_id: str = None, order_link_id: str = None):
         params = {'symbol': symbol,}
@@ -108,46 +392,26 @@ class InversePerp(ByBit):
             params.update({'order_id': order_id})
         if order_link_id:
             params.update({'order_link_id': order_link_id})
-        path = '/v2/private/order'
-        url = f'{self._base_url()}{path}?{self._auth_get_parmas(params)}'
-        logger.debug(f'GET {url}')
-        res = requests.get(url=url)
-        return self._handle_response(res)
+        return self._get('/v2/private/order', params, auth=True)
 
     def public_symbols(self) -> list:
-        path = '/v2/public/symbols'
-        url = f'{self._base_url()}{path}'
-        logger.debug(f'GET {url}')
-        res = requests.get(url=url)
-        return self._handle_response(res)
+        return self._get('/v2/public/symbols')
 
     def public_funding_prevfundingrate(self, symbol: str):
         params = {'symbol': symbol}
-        path = '/v2/public/funding/prev-funding-rate'
-        url = f'{self._base_url()}{path}?{self._sorted_param_str(params)}'
-        logger.debug(f'GET {url}')
-        res = requests.get(url=url)
-        return self._handle_response(res)
+        return self._get('/v2/public/funding/prev-funding-rate', params)
 
     def public_tickers(self, symbol: str = None):
-        p = ''
+        params = {}
         if symbol:
-            p = '?' + self._sorted_param_str({'symbol': symbol})
-        path = '/v2/public/tickers'
-        url = f'{self._base_url()}{path}{p}'
-        logger.info(f'GET {url}')
-        res = requests.get(url=url)
-        return self._handle_response(res)
+            params.update({'symbol': symbol})
+        return self._get('/v2/public/tickers', params)
 
     def public_orderbook_l2(self, symbol: str = None):
-        p = ''
+        params = {}
         if symbol:
-            p = '?' + self._sorted_param_str({'symbol': symbol})
-        path = '/v2/public/orderBook/L2'
-        url = f'{self._base_url()}{path}{p}'
-        logger.info(f'GET {url}')
-        res = requests.get(url=url)
-        return self._handle_response(res)
+            params.update({'symbol': symbol})
+        return self._get('/v2/public/orderBook/L2', params)
 
     def private_order_create(self,
                              symbol: str,
@@ -155,25 +419,24 @@ class InversePerp(ByBit):
                              order_type: str,
                              qty: str,
                              price: str,
-                             time_in_force: str = None):
+                             time_in_force: str = None,
+                             order_link_id: str = None):
+        # the order of a create whose response was lost is found by this id before it is resubmitted
+        order_link_id = order_link_id or uuid.uuid4().hex
         params = {
                 'symbol': symbol,
                 'side': side,
                 'order_type': order_type,
                 'qty': qty,
                 'price': price,
+                'order_link_id': order_link_id,
                 }
 
         if time_in_force:
             params.update({'time_in_force': time_in_force})
 
-        headers = {"Content-Type": "application/json"}
-        path = '/v2/private/order/create'
-        data = self._auth_post_data(params)
-        url = f'{self._base_url()}{path}'
-        logger.debug(f'POST {url}\n{json.dumps(data, indent=True)}')
-        res = requests.post(headers=headers, url=url, data=json.dumps(data))
-        return self._handle_response(res)
+        return self._post('/v2/private/order/create', params,
+                          recover=lambda: self.private_order(symbol=symbol, order_link_id=order_link_id))
 
     def private_order_cancel(self,
                              symbol: str,
@@ -185,13 +448,7 @@ class InversePerp(ByBit):
         if order_link_id:
             params.update({'order_link_id': order_link_id})
 
-        headers = {"Content-Type": "application/json"}
-        path = '/v2/private/order/cancel'
-        data = self._auth_post_data(params)
-        url = f'{self._base_url()}{path}'
-        logger.debug(f'POST {url}\n{json.dumps(data, indent=True)}')
-        res = requests.post(headers=headers, url=url, data=json.dumps(data))
-        return self._handle_response(res)
+        return self._post('/v2/private/order/cancel', params)
 
     def private_order_replace(self,
                               symbol: str,
@@ -209,20 +466,172 @@ class InversePerp(ByBit):
         if p_r_price:
             params.update({'p_r_price': p_r_price})
 
-        headers = {"Content-Type": "application/json"}
-        path = '/v2/private/order/replace'
-        data = self._auth_post_data(params)
-        url = f'{self._base_url()}{path}'
-        logger.debug(f'POST {url}\n{json.dumps(data, indent=True)}')
-        res = requests.post(headers=headers, url=url, data=json.dumps(data))
-        return self._handle_response(res)
+        return self._post('/v2/private/order/replace', params)
 
     def private_order_cancelall(self, symbol: str):
         params = {'symbol': symbol,}
-        headers = {"Content-Type": "application/json"}
-        path = '/v2/private/order/cancelAll'
-        data = self._auth_post_data(params)
-        url = f'{self._base_url()}{path}'
-        logger.debug(f'POST {url}\n{json.dumps(data, indent=True)}')
-        res = requests.post(headers=headers, url=url, data=json.dumps(data))
-        return self._handle_response(res)
+        return self._post('/v2/private/order/cancelAll', params)
+
+    # The v2 inverse perpetual api has no batch endpoints, so the batch
+    # methods pipeline one request per order concurrently.
+
+    def private_order_create_batch(self, orders: list) -> list:
+        '''
+        Parameters
+        ----------
+        orders: list
+            keyword arguments of private_order_create for each order
+        '''
+        return self.batch([(self.private_order_create, o) for o in orders])
+
+    def private_order_cancel_batch(self, orders: list) -> list:
+        return self.batch([(self.private_order_cancel, o) for o in orders])
+
+    def private_order_replace_batch(self, orders: list) -> list:
+        return self.batch([(self.private_order_replace, o) for o in orders])
+
+
+class LinearPerp(ByBit):
+    '''
+    Client of USDT perpetuals, whose quantities are in coin and margins in USDT.
+    '''
+
+    def __init__(self, api_key: str, api_secret: str, test: bool = True, **kwargs):
+        super().__init__(api_key, api_secret, test, **kwargs)
+
+    def private_wallet_balance(self, coin: str = 'USDT'):
+        params = {'coin': coin}
+        return self._get('/v2/private/wallet/balance', params, auth=True)
+
+    def private_linear_position_list(self, symbol: str):
+        params = {'symbol': symbol}
+        return self._get('/private/linear/position/list', params, auth=True)
+
+    def private_linear_order_search(self, symbol: str, order_id: str = None, order_link_id: str = None):
+        params = {'symbol': symbol,}
+        if order_id:
+            params.update({'order_id': order_id})
+        if order_link_id:
+            params.update({'order_link_id': order_link_id})
+        return self._get('/private/linear/order/search', params, auth=True)
+
+    def public_linear_funding_prevfundingrate(self, symbol: str):
+        params = {'symbol': symbol}
+        return self._get('/public/linear/funding/prev-funding-rate', params)
+
+    def public_orderbook_l2(self, symbol: str):
+        params = {'symbol': symbol}
+        return self._get('/v2/public/orderBook/L2', params)
+
+    def private_linear_order_create(self,
+                                    symbol: str,
+                                    side: str,
+                                    order_type: str,
+                                    qty: str,
+                                    price: str = None,
+                                    time_in_force: str = 'GoodTillCancel',
+                                    reduce_only: bool = False,
+                                    close_on_trigger: bool = False,
+                                    order_link_id: str = None):
+        order_link_id = order_link_id or uuid.uuid4().hex
+        params = {
+                'symbol': symbol,
+                'side': side,
+                'order_type': order_type,
+                'qty': qty,
+                'time_in_force': time_in_force,
+                'reduce_only': reduce_only,
+                'close_on_trigger': close_on_trigger,
+                'order_link_id': order_link_id,
+                }
+        if price:
+            params.update({'price': price})
+
+        return self._post('/private/linear/order/create', params,
+                          recover=lambda: self.private_linear_order_search(symbol=symbol, order_link_id=order_link_id))
+
+    def private_linear_order_cancel(self, symbol: str, order_id: str = None, order_link_id: str = None):
+        params = {'symbol': symbol,}
+        if order_id:
+            params.update({'order_id': order_id})
+        if order_link_id:
+            params.update({'order_link_id': order_link_id})
+
+        return self._post('/private/linear/order/cancel', params)
+
+    def private_linear_order_replace(self,
+                                     symbol: str,
+                                     order_id: str = None,
+                                     order_link_id: str = None,
+                                     p_r_qty: str = None,
+                                     p_r_price: str = None):
+        params = {'symbol': symbol,}
+        if order_id:
+            params.update({'order_id': order_id})
+        if order_link_id:
+            params.update({'order_link_id': order_link_id})
+        if p_r_qty:
+            params.update({'p_r_qty': p_r_qty})
+        if p_r_price:
+            params.update({'p_r_price': p_r_price})
+
+        return self._post('/private/linear/order/replace', params)
+
+
+class Spot(ByBit):
+    '''
+    Client of the spot api, which takes the parameters of every method in
+    the query string and has no replace endpoint.
+    '''
+
+    def __init__(self, api_key: str, api_secret: str, test: bool = True, **kwargs):
+        super().__init__(api_key, api_secret, test, **kwargs)
+
+    def spot_symbols(self) -> list:
+        return self._get('/spot/v1/symbols')
+
+    def spot_account(self):
+        return self._get('/spot/v1/account', auth=True)
+
+    def spot_quote_depth(self, symbol: str, limit: int = None):
+        params = {'symbol': symbol}
+        if limit:
+            params.update({'limit': limit})
+        return self._get('/spot/quote/v1/depth', params)
+
+    def spot_order(self, order_id: str = None, order_link_id: str = None):
+        params = {}
+        if order_id:
+            params.update({'orderId': order_id})
+        if order_link_id:
+            params.update({'orderLinkId': order_link_id})
+        return self._get('/spot/v1/order', params, auth=True)
+
+    def spot_order_create(self,
+                          symbol: str,
+                          side: str,
+                          order_type: str,
+                          qty: str,
+                          price: str = None,
+                          time_in_force: str = None):
+        params = {
+                'symbol': symbol,
+                'side': side,
+                'type': order_type,
+                'qty': qty,
+                }
+        if price:
+            params.update({'price': price})
+        if time_in_force:
+            params.update({'timeInForce': time_in_force})
+
+        return self._signed('POST', '/spot/v1/order', params)
+
+    def spot_order_cancel(self, order_id: str = None, order_link_id: str = None):
+        params = {}
+        if order_id:
+            params.update({'orderId': order_id})
+        if order_link_id:
+            params.update({'orderLinkId': order_link_id})
+
+        return self._signed('DELETE', '/spot/v1/order', params)
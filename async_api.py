@@ -0,0 +1,116 @@
+from logging import getLogger
+from typing import Callable
+import asyncio
+import time
+
+import aiohttp
+
+from api import BybitAPIError, CircuitOpenError, InversePerp
+from transport import HEDGED, is_transient
+
+
+logger = getLogger(__name__)
+
+
+class AsyncInversePerp(InversePerp):
+    '''
+    Asyncio variant of InversePerp.
+
+    Every api method has the same signature as InversePerp
+    but returns a coroutine, which has to be awaited.
+    Requests are sent through one aiohttp session whose connector
+    bounds the number of concurrent connections by `pool_size`.
+    '''
+
+    def __init__(self, api_key: str, api_secret: str, test: bool = True, pool_size: int = 100, **kwargs):
+        super().__init__(api_key, api_secret, test, pool_size=pool_size, **kwargs)
+        self.__pool_size = pool_size
+        self.__session = None
+
+    def _open(self, pool_size: int) -> None:
+        # requests are sent by the aiohttp session, created in the event loop on first use
+        pass
+
+    async def close(self) -> None:
+        if self.__session:
+            await self.__session.close()
+            self.__session = None
+
+    def __get_session(self) -> aiohttp.ClientSession:
+        if not self.__session:
+            connect, read = self._timeout()
+            self.__session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=self.__pool_size),
+                    timeout=aiohttp.ClientTimeout(total=connect + read, sock_connect=connect, sock_read=read))
+        return self.__session
+
+    async def batch(self, calls: list) -> list:
+        return await asyncio.gather(*[method(**params) for method, params in calls], return_exceptions=True)
+
+    async def _cached(self, result):
+        return result
+
+    def _transient(self, e: Exception) -> bool:
+        if isinstance(e, aiohttp.ClientResponseError):
+            return e.status == 429 or e.status >= 500
+        return isinstance(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError)) or is_transient(e)
+
+    async def _call(self, path: str, send: Callable, recover: Callable = None, retry: bool = True):
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            if self.breaker and not self.breaker.allow(path):
+                self._record_error(path, 'circuit_open')
+                raise CircuitOpenError(f'Circuit of {path} is open.', 'circuit_open')
+            try:
+                result = None
+                if attempt and recover:
+                    try:
+                        result = await recover()
+                    except BybitAPIError as e:
+                        if self._transient(e):
+                            raise
+                if not result:
+                    result = await send()
+            except Exception as e:
+                delay = self._on_error(path, e, attempt, start, retry)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if self.breaker:
+                self.breaker.success(path)
+            return result
+
+    def _hedge(self, path: str, send: Callable) -> Callable:
+        async def hedged():
+            first = asyncio.ensure_future(send())
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+            if done:
+                return first.result()
+            HEDGED.inc(path)
+            pending = {first, asyncio.ensure_future(send())}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for f in done:
+                    if not f.exception():
+                        for p in pending:
+                            p.cancel()
+                        return f.result()
+            return f.result()
+
+        return hedged
+
+    async def _send(self, method: str, path: str, url: str, cache_key: tuple = None, **kwargs):
+        if self.rate_limiter:
+            await self.rate_limiter.acquire_async(path)
+        start = time.perf_counter()
+        async with self.__get_session().request(method, url, **kwargs) as res:
+            if res.status >= 400:
+                self._record_error(path, f'http_{res.status}')
+            res.raise_for_status()
+            content = await res.read()
+        self._record_latency(method, path, time.perf_counter() - start)
+        result = self._handle_body(content, path)
+        if cache_key:
+            self.cache.set(cache_key, result)
+        return result
@@ -0,0 +1,302 @@
+import os
+import asyncio
+import signal
+import time
+from datetime import datetime, timezone
+
+from constants import *
+from log import error_message
+from main import ENTRY_DELAY, ENTRY_WINDOW, MAINTENANCE_LEAD, MIN_REPRICE_INTERVAL, logger, notifier, send_message
+from async_api import AsyncInversePerp
+from cache import FILL_INVALIDATED_PATHS, PREV_FUNDING_RATE_PATH, TTLCache, until_next_funding
+from chaser import AsyncOrderChaser
+from market import is_inverse_perp
+from models import Order
+from orders import ORDERS
+from ratelimit import PRIORITY_LOW, RateLimiter, priority
+from scheduler import DEFAULT_FUNDING_INTERVAL, next_funding_time
+from strategy import should_enter, should_exit
+from stream import OrderBookStream, PrivateStream
+from transport import CircuitBreaker, RetryPolicy
+
+
+class AsyncFundingRateBot():
+    '''
+    Funding rate bot running the jobs of all symbols in one event loop.
+
+    Parameters
+    ----------
+    symbols: list
+        symbols to trade. all inverse perpetuals listed on Bybit if None.
+    concurrency: int
+        max number of symbols whose job runs at the same time
+    '''
+
+    def __init__(self,
+                 api_key: str,
+                 api_secret: str,
+                 test: bool = True,
+                 symbols: list = None,
+                 concurrency: int = 50):
+        self.test = test
+        self.alive = True
+        self.min_entry_fr: float = 0.0000
+        self.min_exit_fr: float = 0.0000
+        self.concurrency = concurrency
+        self.symbols = symbols
+        self.client = AsyncInversePerp(api_key, api_secret, test,
+                                       rate_limiter=RateLimiter(), cache=TTLCache(),
+                                       retry=RetryPolicy(), breaker=CircuitBreaker())
+        self.chaser = AsyncOrderChaser(self)
+        self.private = PrivateStream(api_key, api_secret, test)
+        self.private.add_execution_listener(
+                lambda e: self.client.cache.invalidate(*FILL_INVALIDATED_PATHS))
+        self.perp_symbols = {}
+        self.books = None
+        self.updates = {}
+        self.loop = None
+
+    async def setup(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.perp_symbols = {s['name']: s for s in await self.client.public_symbols()}
+        self.client.cache.set_ttl(PREV_FUNDING_RATE_PATH, until_next_funding(
+                {n: s['funding_interval'] for n, s in self.perp_symbols.items() if 'funding_interval' in s}))
+        if not self.symbols:
+            self.symbols = [n for n, s in self.perp_symbols.items() if is_inverse_perp(s)]
+        logger.info(f'Target symbols: {self.symbols}')
+        self.updates = {s: asyncio.Event() for s in self.symbols}
+        self.books = OrderBookStream(self.symbols, self.test)
+        self.books.add_listener(self.__on_update)
+        self.private.add_listener(self.__on_update)
+        self.books.start()
+        self.private.start()
+
+    def __on_update(self, symbol: str) -> None:
+        # called from stream threads
+        if symbol in self.updates:
+            self.loop.call_soon_threadsafe(self.updates[symbol].set)
+
+    async def wait_update(self, symbol: str, timeout: float = 20) -> None:
+        await asyncio.sleep(MIN_REPRICE_INTERVAL)
+        try:
+            await asyncio.wait_for(self.updates[symbol].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.updates[symbol].clear()
+
+    async def notify(self, msg: str) -> None:
+        send_message(msg)
+
+    async def run_jobs(self, job, symbols: list) -> None:
+        '''
+        Run the job for each symbol, at most `concurrency` at the same time.
+        A failure of one symbol does not stop the others.
+        '''
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def run(symbol):
+            async with sem:
+                try:
+                    await job(symbol)
+                except Exception as e:
+                    logger.error(f'Failed to run {job.__name__} for {symbol}')
+                    logger.error(error_message(e, traceback=True))
+
+        await asyncio.gather(*[run(s) for s in symbols])
+
+    async def get_order(self, symbol: str, order_id: str) -> Order:
+        order = self.private.order(order_id)
+        if order:
+            return order
+        logger.info(f'Get active order: order_id={order_id}')
+        order = Order.from_dict(await self.client.private_order(symbol=symbol, order_id=order_id))
+        if order.cum_exec_qty:
+            self.client.cache.invalidate(*FILL_INVALIDATED_PATHS)
+        return order
+
+    async def get_perp_best_price(self, symbol: str, side: str) -> str:
+        best = self.books.best(symbol, side)
+        if best:
+            return best[0]
+        res = await self.client.public_orderbook_l2(symbol)
+        return [r for r in res if r['side'] == side][0]['price']
+
+    async def create_invperp_order(self, symbol: str, side: str, usdqty: int, price: float) -> str:
+        logger.info(f'Create an invert perpetual order to {side.lower()} {symbol}. qty={usdqty}, price={price}')
+        res = await self.client.private_order_create(symbol=symbol,
+                                                     side=side,
+                                                     order_type='Limit',
+                                                     qty=usdqty,
+                                                     price=price,
+                                                     time_in_force='PostOnly')
+        ORDERS.inc('created')
+        return res['order_id']
+
+    async def available_balance(self, symbol: str) -> float:
+        coin = self.perp_symbols[symbol]['base_currency']
+        balance = (await self.client.private_wallet_balance())[coin]['available_balance']
+        logger.info(f'Available balance: account=derivative, coin={coin}, balance={balance :.8f}')
+        return balance
+
+    def calc_qty(self, balance: float, price) -> int:
+        '''
+        Returns
+        -------
+        int
+            quantity of US dollar
+        '''
+        qty = float(price) * balance
+        market_order_cost = qty * DERIVATIVE_TAKER_FEE_RATE
+        return int(qty - market_order_cost)
+
+    async def create_perp_short(self, symbol: str) -> None:
+        logger.info(f"Start to create short position of {symbol}")
+
+        # the balance is fetched once, and the quantity follows the price
+        balance = await self.available_balance(symbol)
+        price = await self.get_perp_best_price(symbol, 'Sell')
+        qty = self.calc_qty(balance, price)
+        min_qty = self.perp_symbols[symbol]['lot_size_filter']['min_trading_qty']
+        if qty < min_qty:
+            logger.info(f"Can't create an order because qty({qty}) is less than min_trading_qty({min_qty}).")
+            return
+
+        def resize(price, filled_qty, filled_value):
+            return filled_qty + self.calc_qty(balance - filled_value, price)
+
+        filled = await self.chaser.chase(symbol, 'Sell', qty, min_qty, resize)
+        if filled:
+            await self.notify(f"Created short position for {filled} {symbol}.")
+
+    async def close_perp_short(self, symbol: str, usdqty) -> None:
+        logger.info(f'Close short position of {usdqty} {symbol}.')
+        filled = await self.chaser.chase(symbol, 'Buy', usdqty)
+        if filled:
+            await self.notify(f"Short position was closed for {filled} {symbol}.")
+
+    async def maintain_position(self, symbol: str) -> None:
+        prev_fr, pos = await asyncio.gather(
+                self.client.public_funding_prevfundingrate(symbol=symbol),
+                self.client.private_position_list(symbol))
+        fr = float(prev_fr['funding_rate'])
+        logger.info(f"Previous {symbol} FR: {fr:.6%}, position size: {pos['size']}")
+
+        if should_exit(pos['size'], fr, self.min_exit_fr):
+            await self.close_perp_short(symbol=symbol, usdqty=pos['size'])
+
+        if should_enter(fr, self.min_entry_fr):
+            await self.create_perp_short(symbol)
+
+    async def send_pos_maintenance_result(self) -> None:
+        with priority(PRIORITY_LOW):
+            await self.__send_pos_maintenance_result()
+        logger.info(f'Rate limit stats: {self.client.rate_limiter.stats()}')
+
+    async def __send_pos_maintenance_result(self) -> None:
+        frs = await asyncio.gather(
+                *[self.client.public_funding_prevfundingrate(symbol=s) for s in self.symbols])
+        fr_s = ', '.join([f"{f['symbol']}={float(f['funding_rate']):.6%}" for f in frs])
+
+        pos = await self.client.private_position_list()
+        p_s = [f"{p['data']['symbol']}={p['data']['size']}" for p in pos if p['data']['size'] > 0]
+
+        now = datetime.now(timezone.utc)
+        msg = f"""bybit-fr-bot maintained result ({now.strftime('%Y-%m-%d %H:%M:%S')} UTC).
+```
+[PrevFR]
+{fr_s}
+
+[Positions]
+{', '.join(p_s)}
+```
+"""
+        await self.notify(msg)
+
+    def funding_interval(self, symbol: str) -> int:
+        return self.perp_symbols.get(symbol, {}).get('funding_interval', DEFAULT_FUNDING_INTERVAL)
+
+    async def run_funding(self, interval: int, symbols: list, stopped: asyncio.Event) -> None:
+        '''
+        Maintain the positions of the symbols before each funding time, and
+        create positions after it, until stopped.
+
+        Parameters
+        ----------
+        interval: int
+            funding interval of the symbols in minutes
+        '''
+        now = time.time()
+        funding_time = next_funding_time(now, interval)
+        if now < funding_time - interval * 60 + ENTRY_WINDOW:
+            # started right after a funding time, so create positions first
+            if not await self.sleep_until(funding_time - interval * 60 + ENTRY_DELAY, stopped):
+                await self.run_window(self.create_perp_short, symbols)
+
+        while not stopped.is_set():
+            if not await self.sleep_until(funding_time - MAINTENANCE_LEAD, stopped):
+                await self.run_window(self.maintain_position, symbols)
+            if not await self.sleep_until(funding_time + ENTRY_DELAY, stopped):
+                await self.run_window(self.create_perp_short, symbols)
+            funding_time += interval * 60
+
+    async def run_window(self, job, symbols: list) -> None:
+        await self.run_jobs(job, symbols)
+        await self.send_pos_maintenance_result()
+        logger.info(f"Sleeping...")
+
+    async def sleep_until(self, t: float, stopped: asyncio.Event) -> bool:
+        '''
+        Returns
+        -------
+        bool
+            True if stopped before the time
+        '''
+        try:
+            await asyncio.wait_for(stopped.wait(), max(0.0, t - time.time()))
+        except asyncio.TimeoutError:
+            pass
+        return stopped.is_set()
+
+    def __stop(self, signum, stopped: asyncio.Event) -> None:
+        logger.info(f"Received {signum} signal.")
+        self.alive = False
+        stopped.set()
+
+    async def shutdown(self) -> None:
+        logger.info('Stop bot.')
+        await self.client.batch([(self.client.private_order_cancelall, {'symbol': s}) for s in self.symbols])
+        self.books.stop()
+        self.private.stop()
+        await self.client.close()
+        notifier.flush()
+
+    async def run(self) -> None:
+        await self.setup()
+        stopped = asyncio.Event()
+        for s in (signal.SIGTERM, signal.SIGINT):
+            self.loop.add_signal_handler(s, self.__stop, s, stopped)
+
+        env = 'TESTNET' if self.test else 'MAINNET'
+        m = f'Run bybit-frbot (async) in {env} for {len(self.symbols)} symbols.'
+        logger.info(m)
+        await self.notify(m)
+
+        # symbols of the same funding interval share their funding times
+        groups = {}
+        for s in self.symbols:
+            groups.setdefault(self.funding_interval(s), []).append(s)
+        await asyncio.gather(*[self.run_funding(i, ss, stopped) for i, ss in groups.items()])
+
+        await self.shutdown()
+
+
+if __name__ == '__main__':
+    try:
+        bot = AsyncFundingRateBot(api_key=os.environ['BYBIT_APIKEY'],
+                                  api_secret=os.environ['BYBIT_SECRET'],
+                                  test=os.environ['BYBIT_TEST'].lower() == 'true')
+        asyncio.run(bot.run())
+    except Exception as e:
+        logger.error(error_message(e, traceback=True))
+        send_message(f"An error has occurred.\n```{error_message(e)}```")
+        notifier.flush()
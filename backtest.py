@@ -0,0 +1,187 @@
+'''
+Backtester of the funding rate strategy.
+
+Replays historical funding rates (and optionally trades) of one symbol
+through the entry/exit rules of strategy.py. Every window of every
+parameter set is evaluated at once with numpy, so a sweep over
+thresholds of years of data takes a fraction of a second.
+
+funding csv: timestamp,symbol,funding_rate   (timestamp = funding time, unix seconds)
+trades csv:  timestamp,symbol,side,price     (side = Buy for taker buys)
+'''
+import argparse
+import csv
+import time
+
+import numpy as np
+
+from constants import DERIVATIVE_MAKER_FEE_RATE, DERIVATIVE_TAKER_FEE_RATE
+from strategy import should_enter, should_exit
+
+
+MAINTENANCE_LEAD = 5 * 60
+'''seconds between maintain_position and the funding time'''
+
+
+def load_funding(path: str, symbol: str) -> tuple:
+    ts, fr = [], []
+    with open(path) as f:
+        for r in csv.DictReader(f):
+            if r['symbol'] == symbol:
+                ts.append(float(r['timestamp']))
+                fr.append(float(r['funding_rate']))
+    order = np.argsort(ts)
+    return np.asarray(ts)[order], np.asarray(fr)[order]
+
+
+def load_buy_trades(path: str, symbol: str) -> np.ndarray:
+    '''
+    Returns
+    -------
+    np.ndarray
+        sorted timestamps of taker buys, which fill a PostOnly sell at the best ask
+    '''
+    ts = []
+    with open(path) as f:
+        for r in csv.DictReader(f):
+            if r['symbol'] == symbol and r['side'] == 'Buy':
+                ts.append(float(r['timestamp']))
+    return np.sort(np.asarray(ts))
+
+
+def fill_delays(windows: np.ndarray, buy_trades: np.ndarray) -> np.ndarray:
+    '''
+    Seconds from each window until the short entry chased at the best ask is filled,
+    i.e. until the next taker buy. inf if no taker buy follows.
+    '''
+    i = np.searchsorted(buy_trades, windows)
+    delays = np.full(len(windows), np.inf)
+    found = i < len(buy_trades)
+    delays[found] = buy_trades[i[found]] - windows[found]
+    return delays
+
+
+def forward_fill(values: np.ndarray, defined: np.ndarray, initial: float = 0.0) -> np.ndarray:
+    '''
+    Replace the undefined elements on the last axis by the last defined one.
+    '''
+    n = values.shape[-1]
+    idx = np.where(defined, np.arange(1, n + 1), 0)
+    idx = np.maximum.accumulate(idx, axis=-1)
+    padded = np.concatenate([np.full(values.shape[:-1] + (1,), initial), values], axis=-1)
+    return np.take_along_axis(padded, idx, axis=-1)
+
+
+def simulate(fr: np.ndarray,
+             min_entry_fr: np.ndarray,
+             min_exit_fr: np.ndarray,
+             fee_rate: float = DERIVATIVE_MAKER_FEE_RATE,
+             reenter: bool = True,
+             delays: np.ndarray = None) -> dict:
+    '''
+    Simulate the strategy for every combination of thresholds.
+
+    Parameters
+    ----------
+    fr: np.ndarray
+        funding rates of each funding time, shape (T,)
+    min_entry_fr, min_exit_fr: np.ndarray
+        thresholds to sweep, shape (E,) and (X,)
+    fee_rate: float
+        fee rate of each entry and exit (negative for a rebate)
+    reenter: bool
+        create a short position again right after each funding time,
+        as the bot does with its second job
+    delays: np.ndarray
+        seconds to fill the entry of each window, shape (T,). an entry not
+        filled within the maintenance lead time misses the funding.
+
+    Returns
+    -------
+    dict
+        arrays of shape (E, X): total return (ratio of notional), funding
+        income, fees, number of trades and funding times held
+    '''
+    # decision at window t is made from the rate settled at funding t-1
+    prev = np.concatenate([[np.nan], fr[:-1]])[None, None, :]
+    entry = np.asarray(min_entry_fr, dtype=float)[:, None, None]
+    exit_ = np.asarray(min_exit_fr, dtype=float)[None, :, None]
+    valid = ~np.isnan(prev)
+
+    shape = (len(entry), exit_.shape[1], len(fr))
+    enter = np.broadcast_to(should_enter(prev, entry) & valid, shape)
+    # whether a held position would be closed, which decides the state carried without reentries
+    leave = np.broadcast_to(should_exit(True, prev, exit_) & valid, shape)
+
+    if reenter:
+        before = np.ones(enter.shape, dtype=bool)
+    else:
+        held = forward_fill(enter.astype(float), enter | leave).astype(bool)
+        before = np.concatenate([np.zeros(held.shape[:-1] + (1,), dtype=bool), held[..., :-1]], axis=-1)
+
+    close = should_exit(before, prev, exit_) & valid
+    open_ = enter & (~before | close)
+    held = (before & ~close) | open_
+
+    if delays is not None:
+        held &= ~(open_ & (delays > MAINTENANCE_LEAD)[None, None, :])
+
+    trades = close.sum(axis=-1) + open_.sum(axis=-1)
+    if reenter:
+        # positions closed before the funding time are created again after it
+        trades += (~((before & ~close) | open_)).sum(axis=-1)
+
+    funding = (held * fr[None, None, :]).sum(axis=-1)
+    fees = trades * fee_rate
+    return {
+        'return': funding - fees,
+        'funding': funding,
+        'fees': fees,
+        'trades': trades,
+        'held': held.sum(axis=-1),
+    }
+
+
+def parse_range(s: str) -> np.ndarray:
+    if ':' not in s:
+        return np.asarray([float(s)])
+    start, stop, step = [float(v) for v in s.split(':')]
+    return np.arange(start, stop + step / 2, step)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest the funding rate strategy.')
+    parser.add_argument('funding', help='csv of funding rates')
+    parser.add_argument('--symbol', default='BTCUSD')
+    parser.add_argument('--trades', help='csv of trades to simulate fills of the entry chase')
+    parser.add_argument('--entry', default='0', help='min_entry_fr, or start:stop:step to sweep')
+    parser.add_argument('--exit', default='0', help='min_exit_fr, or start:stop:step to sweep')
+    parser.add_argument('--taker', action='store_true', help='pay the taker fee instead of the maker fee')
+    parser.add_argument('--no-reenter', action='store_true', help='do not create positions after funding times')
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    ts, fr = load_funding(args.funding, args.symbol)
+    delays = None
+    if args.trades:
+        delays = fill_delays(ts - MAINTENANCE_LEAD, load_buy_trades(args.trades, args.symbol))
+
+    entries, exits = parse_range(args.entry), parse_range(args.exit)
+    start = time.perf_counter()
+    res = simulate(fr, entries, exits,
+                   fee_rate=DERIVATIVE_TAKER_FEE_RATE if args.taker else DERIVATIVE_MAKER_FEE_RATE,
+                   reenter=not args.no_reenter,
+                   delays=delays)
+    elapsed = time.perf_counter() - start
+
+    print(f'{args.symbol}: {len(fr)} funding times, {len(entries) * len(exits)} parameter sets '
+          f'in {elapsed * 1000:.1f} ms')
+    best = np.argsort(res['return'], axis=None)[::-1][:args.top]
+    for e, x in zip(*np.unravel_index(best, res['return'].shape)):
+        print(f"min_entry_fr={entries[e]:.6%} min_exit_fr={exits[x]:.6%} "
+              f"return={res['return'][e, x]:.4%} funding={res['funding'][e, x]:.4%} "
+              f"fees={res['fees'][e, x]:.4%} trades={res['trades'][e, x]} held={res['held'][e, x]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+'''
+Benchmark of a funding cycle against the local mock exchange.
+
+Runs maintain_position for N symbols concurrently (as FundingRateBot.run
+does before each funding time) followed by the maintenance report, and
+reports order latency percentiles and api calls per cycle.
+
+    python bench_cycle.py --symbols 20 --latency 20 --cycles 3
+'''
+import argparse
+import time
+from collections import defaultdict
+from threading import Lock, Thread
+
+import numpy as np
+
+from main import FundingRateBot
+from mock_exchange import MockExchange
+from ratelimit import RATE_LIMITS
+
+
+ORDER_PATHS = {
+    '/v2/private/order/create',
+    '/v2/private/order/cancel',
+    '/v2/private/order/replace',
+}
+
+
+class LatencyRecorder(object):
+
+    def __init__(self):
+        self.lock = Lock()
+        self.latencies = defaultdict(list)
+
+    def __call__(self, method: str, path: str, elapsed: float) -> None:
+        with self.lock:
+            self.latencies[path].append(elapsed)
+
+    def reset(self) -> dict:
+        with self.lock:
+            latencies, self.latencies = self.latencies, defaultdict(list)
+        return latencies
+
+
+def symbols(n: int) -> list:
+    base = ['BTCUSD', 'ETHUSD', 'XRPUSD', 'EOSUSD']
+    return (base + [f'C{i:02d}USD' for i in range(n)])[:n]
+
+
+def run_cycle(bot: FundingRateBot) -> None:
+    threads = [Thread(target=bot.maintain_position, args=(s,)) for s in bot.symbols]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    bot.send_pos_maintenance_result()
+
+
+def percentile(values: list, q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark a funding cycle against the mock exchange.')
+    parser.add_argument('--symbols', type=int, default=4)
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=10, help='mean latency of the exchange (ms)')
+    parser.add_argument('--jitter', type=float, default=5, help='stddev of the latency (ms)')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--lost-rate', type=float, default=0.0, help='ratio of responses lost after execution')
+    parser.add_argument('--no-rate-limit', action='store_true')
+    parser.add_argument('--fill-prob', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    exchange = MockExchange(symbols(args.symbols),
+                            latency=args.latency / 1000,
+                            jitter=args.jitter / 1000,
+                            error_rate=args.error_rate,
+                            lost_rate=args.lost_rate,
+                            rate_limits=None if args.no_rate_limit else RATE_LIMITS,
+                            fill_prob=args.fill_prob,
+                            seed=args.seed)
+    exchange.start()
+
+    recorder = LatencyRecorder()
+    bot = FundingRateBot('key', 'secret', symbols=exchange.symbols,
+                         base_url=exchange.url, latency_hook=recorder, persistent_cache=False)
+    bot.poll_interval = 0.1
+    bot.min_reprice_interval = 0.05
+
+    print(f'{args.symbols} symbols, latency={args.latency}ms (+/-{args.jitter}ms), error_rate={args.error_rate}, lost_rate={args.lost_rate}')
+    for i in range(args.cycles):
+        # each cycle starts from an empty account
+        with exchange.lock:
+            exchange.positions = {s: 0 for s in exchange.symbols}
+        bot.client.cache.invalidate('/v2/private/wallet/balance')
+
+        start = time.perf_counter()
+        run_cycle(bot)
+        elapsed = time.perf_counter() - start
+
+        latencies = recorder.reset()
+        orders = [v for p, vs in latencies.items() if p in ORDER_PATHS for v in vs]
+        calls = sum(len(v) for v in latencies.values())
+        print(f'cycle {i + 1}: {elapsed:.2f}s, {calls} calls '
+              f'({calls / args.symbols:.1f}/symbol), order latency '
+              f'p50={percentile(orders, 50):.1f}ms p99={percentile(orders, 99):.1f}ms')
+        for path, vs in sorted(latencies.items()):
+            print(f'  {path}: {len(vs)} calls, p50={percentile(vs, 50):.1f}ms p99={percentile(vs, 99):.1f}ms')
+
+    print(f'order manager: {bot.orders.requests} requests in {bot.orders.rounds} rounds')
+    exchange.stop()
+    bot.client.close()
+
+
+if __name__ == '__main__':
+    main()
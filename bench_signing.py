@@ -0,0 +1,76 @@
+'''
+Micro-benchmark of signing and encoding the parameters of a request.
+
+Compares Signer with the former implementation, which rebuilt the HMAC
+key and concatenated the query string on every request.
+
+    python bench_signing.py --number 100000
+'''
+import argparse
+import hashlib
+import hmac
+import json
+import time
+import timeit
+
+from signer import Signer
+
+
+API_KEY = 'xxxxxxxxxxxxxxxxxx'
+API_SECRET = 'yyyyyyyyyyyyyyyyyyyyyyyyyyyyyyyyyyyy'
+
+ORDER = {'symbol': 'BTCUSD', 'side': 'Sell', 'order_type': 'Limit', 'qty': 100,
+         'price': '60000.5', 'time_in_force': 'PostOnly'}
+REPLACE = {'symbol': 'BTCUSD', 'order_id': '00000000-0000-0000-0000-000000000000', 'p_r_price': '60000.5'}
+QUERY = {'symbol': 'BTCUSD', 'order_id': '00000000-0000-0000-0000-000000000000'}
+
+
+def legacy_param_str(params: dict) -> str:
+    params.update({'api_key': API_KEY, 'timestamp': str(round(time.time() * 1000))})
+    s = ''
+    for k in sorted(params.keys()):
+        v = params[k]
+        if isinstance(params[k], bool):
+            v = 'true' if v else 'false'
+        s += f"{k}={v}&"
+    return s[:-1]
+
+
+def legacy_sign(param_str: str) -> str:
+    return hmac.new(bytes(API_SECRET, 'utf-8'), param_str.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def legacy_query(params: dict) -> str:
+    param_str = legacy_param_str(dict(params))
+    return f'{param_str}&sign={legacy_sign(param_str)}'
+
+
+def legacy_body(params: dict) -> str:
+    params = dict(params)
+    param_str = legacy_param_str(params)
+    params['sign'] = legacy_sign(param_str)
+    return json.dumps(params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark request signing.')
+    parser.add_argument('--number', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    signer = Signer(API_KEY, API_SECRET)
+    cases = [
+        ('GET  private/order', legacy_query, lambda p: signer.request(p).query(), QUERY),
+        ('POST order/create', legacy_body, lambda p: signer.request(p).body(), ORDER),
+        ('POST order/replace', legacy_body, lambda p: signer.request(p).body(), REPLACE),
+        ('sign only', legacy_sign, signer.sign, 'api_key=x&symbol=BTCUSD&timestamp=1600000000000'),
+    ]
+    print(f'{"case":<20} {"legacy us/op":>12} {"signer us/op":>12} {"speedup":>8}')
+    for name, legacy, new, params in cases:
+        a = min(timeit.repeat(lambda: legacy(params), number=args.number, repeat=args.repeat)) / args.number
+        b = min(timeit.repeat(lambda: new(params), number=args.number, repeat=args.repeat)) / args.number
+        print(f'{name:<20} {a * 1e6:>12.2f} {b * 1e6:>12.2f} {a / b:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+from logging import getLogger
+from threading import Lock
+from typing import Callable
+from urllib.parse import urlparse
+import json
+import os
+import re
+import time
+
+from scheduler import DEFAULT_FUNDING_INTERVAL
+
+
+logger = getLogger(__name__)
+
+
+PREV_FUNDING_RATE_PATH = '/v2/public/funding/prev-funding-rate'
+
+
+def until_next_funding(intervals: dict = None) -> Callable[[dict, dict], float]:
+    '''
+    Parameters
+    ----------
+    intervals: dict
+        funding interval in minutes by symbol. DEFAULT_FUNDING_INTERVAL if missing.
+
+    Returns
+    -------
+    Callable[[dict, dict], float]
+        ttl of a previous funding rate, which lasts until the funding time
+        of the rate plus the funding interval of its symbol
+    '''
+    def ttl(params: dict, value: dict) -> float:
+        minutes = (intervals or {}).get(params.get('symbol'), DEFAULT_FUNDING_INTERVAL)
+        return float(value['funding_rate_timestamp']) + minutes * 60 - time.time()
+
+    return ttl
+
+
+CACHE_TTLS = {
+    '/v2/public/symbols': 24 * 60 * 60,
+    PREV_FUNDING_RATE_PATH: until_next_funding(),
+    '/v2/private/wallet/balance': 5,
+}
+'''seconds, or a function of the parameters and the response returning seconds, to keep the response of each path'''
+
+PERSISTENT_PATHS = {'/v2/public/symbols'}
+'''paths whose responses are also saved on disk to warm up the next start'''
+
+FILL_INVALIDATED_PATHS = ['/v2/private/wallet/balance']
+'''paths whose responses are stale once an own order is filled'''
+
+CACHE_DIR = os.path.join(os.environ.get('STORE_DIR', 'data'), 'cache')
+'''directory of the persistent responses, under the data directory kept across container restarts'''
+
+
+class TTLCache(object):
+    '''
+    Cache of GET responses keyed by path, parameters and the base url of
+    the api, so that responses of mainnet, testnet and a mock exchange
+    are never served for each other.
+
+    Only the paths listed in `ttls` are cached.
+    '''
+
+    def __init__(self, ttls: dict = CACHE_TTLS, cache_dir: str = CACHE_DIR, persistent: set = PERSISTENT_PATHS):
+        self.__ttls = dict(ttls)
+        self.__cache_dir = cache_dir
+        self.__persistent = persistent
+        self.__lock = Lock()
+        self.__entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, path: str, params: dict = None, base_url: str = '') -> tuple:
+        '''
+        Returns
+        -------
+        tuple
+            cache key of the request, or None if the path is not cached
+        '''
+        if path not in self.__ttls:
+            return None
+        return path, tuple(sorted((params or {}).items())), base_url
+
+    def get(self, key: tuple):
+        '''
+        Returns
+        -------
+        object
+            cached response, or None if missed or expired
+        '''
+        if not key:
+            return None
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None and key[0] in self.__persistent:
+                entry = self.__load(key)
+            if entry and entry[0] > time.time():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, key: tuple, value) -> None:
+        if not key:
+            return
+        ttl = self.__ttls[key[0]]
+        if callable(ttl):
+            ttl = ttl(dict(key[1]), value)
+        if ttl <= 0:
+            # stale already, e.g. a rate not updated yet after its funding time
+            with self.__lock:
+                self.__entries.pop(key, None)
+            return
+        expires_at = time.time() + ttl
+        with self.__lock:
+            self.__entries[key] = (expires_at, value)
+        if key[0] in self.__persistent:
+            self.__save(key, expires_at, value)
+
+    def set_ttl(self, path: str, ttl) -> None:
+        '''
+        Change the ttl of a cached path, e.g. once the funding intervals of the symbols are known.
+        '''
+        self.__ttls[path] = ttl
+
+    def invalidate(self, *paths: str) -> None:
+        with self.__lock:
+            for k in [k for k in self.__entries if k[0] in paths]:
+                del self.__entries[k]
+
+    def __file(self, key: tuple) -> str:
+        name = key[0].strip('/').replace('/', '_')
+        host = urlparse(key[2]).netloc
+        if host:
+            name = re.sub(r'[^\w.-]', '-', host) + '_' + name
+        if key[1]:
+            name += '_' + '_'.join(f'{k}-{v}' for k, v in key[1])
+        return os.path.join(self.__cache_dir, f'{name}.json')
+
+    def __load(self, key: tuple) -> tuple:
+        try:
+            with open(self.__file(key)) as f:
+                d = json.load(f)
+        except (OSError, ValueError):
+            return None
+        entry = (d['expires_at'], d['value'])
+        self.__entries[key] = entry
+        logger.info(f'Loaded cache of {key[0]} from disk.')
+        return entry
+
+    def __save(self, key: tuple, expires_at: float, value) -> None:
+        try:
+            os.makedirs(self.__cache_dir, exist_ok=True)
+            tmp = self.__file(key) + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'expires_at': expires_at, 'value': value}, f)
+            os.replace(tmp, self.__file(key))
+        except OSError as e:
+            logger.warning(f'Failed to save cache of {key[0]}: {e}')
@@ -0,0 +1,346 @@
+from concurrent.futures import TimeoutError
+from logging import getLogger
+from threading import Condition
+from typing import Callable
+import time
+
+from api import BybitAPIError
+from metrics import DURATION_BUCKETS, Histogram
+from orders import ORDER_TIMEOUT, ORDERS
+
+
+logger = getLogger('frbot')
+
+
+TIME_TO_FILL = Histogram('frbot_time_to_fill_seconds', 'Seconds from the first order to the fill of a chase.',
+                         ('side',), buckets=DURATION_BUCKETS)
+REPRICE_SECONDS = Histogram('frbot_reprice_seconds', 'Seconds of a reprice iteration excluding the wait for updates.',
+                            ('side',))
+
+CREATE, STOP, CANCEL, KEEP, REPLACE = 'create', 'stop', 'cancel', 'keep', 'replace'
+'''actions of a chase on its order which is not filled yet'''
+
+
+class OrderChaser(object):
+    '''
+    Keeps a PostOnly order at the best price until the whole quantity is filled.
+
+    The price is amended in place with private_order_replace, so the order
+    keeps its id and is not cancelled on each reprice. A new order is created
+    only when the exchange cancels one, for the quantity not filled yet.
+
+    The state of each chase is written to the journal of the bot if it has
+    one, so that a restarted bot can resume it with the same order.
+
+    Parameters
+    ----------
+    bot: FundingRateBot
+        provides orders, get_perp_best_price, get_order, wait_update, alive,
+        store and journal
+    '''
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.__saved = {}
+        self.__running = 0
+        self.__idle = Condition()
+
+    def chase(self,
+              symbol: str,
+              side: str,
+              qty: int,
+              min_qty: int = 1,
+              resize: Callable[[str, int, float], int] = None,
+              order_id: str = None,
+              done: tuple = (0, 0.0)) -> int:
+        '''
+        Parameters
+        ----------
+        qty: int
+            quantity of US dollar to fill
+        min_qty: int
+            stop when the quantity left is less than this
+        resize: Callable[[str, int, float], int]
+            called with (new price, filled qty, filled value in coin) on each
+            reprice to get the new total quantity. the quantity is fixed if None.
+        order_id: str
+            order to resume chasing with instead of creating a new one
+        done: tuple
+            quantity and value in coin filled by the cancelled orders of a resumed chase
+
+        Returns
+        -------
+        int
+            filled quantity
+        '''
+        with self.__idle:
+            self.__running += 1
+        try:
+            filled = self.__chase(symbol, side, qty, min_qty, resize, order_id, done)
+            # the chase is left in the journal if it was stopped by a shutdown
+            if self.bot.alive and self.bot.journal:
+                self.bot.journal.chase_done(symbol)
+            self.__saved.pop(symbol, None)
+            return filled
+        finally:
+            with self.__idle:
+                self.__running -= 1
+                self.__idle.notify_all()
+
+    def wait(self, timeout: float = None) -> bool:
+        '''
+        Block until no chase is running, e.g. after the bot is stopped.
+
+        Returns
+        -------
+        bool
+            False if chases are still running after timeout seconds
+        '''
+        with self.__idle:
+            return self.__idle.wait_for(lambda: not self.__running, timeout)
+
+    def __chase(self, symbol, side, qty, min_qty, resize, order_id, done) -> int:
+        bot = self.bot
+        start = time.perf_counter()
+        if not order_id:
+            if not bot.alive:
+                return done[0]
+            price = bot.get_perp_best_price(symbol, side)
+            order_id = bot.create_invperp_order(symbol, side, qty - done[0], price)
+            self.__record('created', symbol, order_id, side, price, qty - done[0])
+
+        # quantity and value filled by the orders cancelled so far
+        done_qty, done_value = done
+        self.__save(symbol, side, qty, min_qty, order_id, done_qty, done_value)
+
+        while bot.alive:
+            bot.wait_update(symbol)
+            t = time.perf_counter()
+
+            order = bot.get_order(symbol, order_id)
+            logger.debug('Active Order: %s', order)
+            filled_qty = done_qty + order['cum_exec_qty']
+            filled_value = done_value + _exec_value(order)
+
+            if _is_filled(order):
+                logger.info(f'Order was filled. order_id={order_id}')
+                ORDERS.inc('filled')
+                TIME_TO_FILL.observe(time.perf_counter() - start, side)
+                self.__record('filled', symbol, order_id, side, order['price'], order['qty'], order['cum_exec_qty'])
+                return filled_qty
+
+            price = bot.get_perp_best_price(symbol, side)
+            if resize:
+                qty = max(resize(price, filled_qty, filled_value), filled_qty)
+
+            action = _next_action(order, price, qty, done_qty, filled_qty, min_qty)
+            if action in (CREATE, STOP):
+                logger.info(f"Order was cancelled. order_id={order_id}, reason={order.get('reject_reason')}")
+                self.__record(order['order_status'], symbol, order_id, side,
+                              order['price'], order['qty'], order['cum_exec_qty'])
+                done_qty, done_value = filled_qty, filled_value
+                if action == STOP:
+                    logger.info(f"Stop chasing because qty({qty - done_qty}) is less than min_trading_qty({min_qty}).")
+                    return done_qty
+                if not bot.alive:
+                    break
+                order_id = bot.create_invperp_order(symbol, side, qty - done_qty, price)
+                self.__record('created', symbol, order_id, side, price, qty - done_qty)
+                self.__save(symbol, side, qty, min_qty, order_id, done_qty, done_value)
+                continue
+
+            if action == CANCEL:
+                logger.info(f"Cancel order because qty left({qty - filled_qty}) is less than min_trading_qty({min_qty}).")
+                try:
+                    bot.orders.cancel(symbol=symbol, order_id=order_id).result(ORDER_TIMEOUT)
+                    self.__record('cancelled', symbol, order_id, side, order['price'], order['qty'], order['cum_exec_qty'])
+                except (BybitAPIError, TimeoutError) as e:
+                    logger.warning(f'Failed to cancel order. order_id={order_id}, error={e}')
+                return filled_qty
+
+            if action == KEEP:
+                continue
+
+            order_qty = qty - done_qty
+            logger.info(f"Replace {side} order: symbol={symbol}, price={price}, qty={order_qty}, "
+                        f"leaves_qty={order['leaves_qty']}, order_id={order_id}")
+            params = _replace_params(symbol, order_id, order, price, order_qty)
+            if not bot.alive:
+                break
+            try:
+                order_id = bot.orders.replace(**params).result(ORDER_TIMEOUT)['order_id']
+                self.__record('replaced', symbol, order_id, side, price, order_qty, order['cum_exec_qty'])
+                self.__save(symbol, side, qty, min_qty, order_id, done_qty, done_value)
+            except (BybitAPIError, TimeoutError) as e:
+                # filled or cancelled in the meantime, which the next loop sees
+                logger.warning(f'Failed to replace order. order_id={order_id}, error={e}')
+            REPRICE_SECONDS.observe(time.perf_counter() - t, side)
+
+        return done_qty
+
+    def __save(self, symbol: str, side: str, qty: int, min_qty: int, order_id: str,
+               done_qty: int, done_value: float) -> None:
+        state = {'side': side, 'qty': qty, 'min_qty': min_qty, 'order_id': order_id,
+                 'done_qty': done_qty, 'done_value': done_value}
+        # a reprice only changes the price, which is not needed to resume
+        if self.bot.journal and self.__saved.get(symbol) != state:
+            self.bot.journal.chase(symbol, **state)
+            self.__saved[symbol] = state
+
+    def __record(self, event: str, symbol: str, order_id: str, side: str, price, qty, cum_exec_qty=0) -> None:
+        if self.bot.store:
+            self.bot.store.add_order_event(event, symbol, order_id, side, price, qty, cum_exec_qty)
+
+
+class AsyncOrderChaser(object):
+    '''
+    Asyncio variant of OrderChaser, which takes the same decisions on each
+    update of the order. Requests are sent by the client of the bot, as the
+    event loop already sends the requests of all symbols concurrently.
+
+    Parameters
+    ----------
+    bot: AsyncFundingRateBot
+        provides client, get_perp_best_price, get_order, create_invperp_order,
+        wait_update and alive
+    '''
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def chase(self,
+                    symbol: str,
+                    side: str,
+                    qty: int,
+                    min_qty: int = 1,
+                    resize: Callable[[str, int, float], int] = None) -> int:
+        '''
+        Parameters are those of OrderChaser.chase.
+
+        Returns
+        -------
+        int
+            filled quantity
+        '''
+        bot = self.bot
+        start = time.perf_counter()
+        if not bot.alive:
+            return 0
+        price = await bot.get_perp_best_price(symbol, side)
+        order_id = await bot.create_invperp_order(symbol, side, qty, price)
+
+        # quantity and value filled by the orders cancelled so far
+        done_qty, done_value = 0, 0.0
+
+        while bot.alive:
+            await bot.wait_update(symbol)
+            t = time.perf_counter()
+
+            order = await bot.get_order(symbol, order_id)
+            logger.debug('Active Order: %s', order)
+            filled_qty = done_qty + order['cum_exec_qty']
+            filled_value = done_value + _exec_value(order)
+
+            if _is_filled(order):
+                logger.info(f'Order was filled. order_id={order_id}')
+                ORDERS.inc('filled')
+                TIME_TO_FILL.observe(time.perf_counter() - start, side)
+                return filled_qty
+
+            price = await bot.get_perp_best_price(symbol, side)
+            if resize:
+                qty = max(resize(price, filled_qty, filled_value), filled_qty)
+
+            action = _next_action(order, price, qty, done_qty, filled_qty, min_qty)
+            if action in (CREATE, STOP):
+                logger.info(f"Order was cancelled. order_id={order_id}, reason={order.get('reject_reason')}")
+                done_qty, done_value = filled_qty, filled_value
+                if action == STOP:
+                    logger.info(f"Stop chasing because qty({qty - done_qty}) is less than min_trading_qty({min_qty}).")
+                    return done_qty
+                if not bot.alive:
+                    break
+                order_id = await bot.create_invperp_order(symbol, side, qty - done_qty, price)
+                continue
+
+            if action == CANCEL:
+                logger.info(f"Cancel order because qty left({qty - filled_qty}) is less than min_trading_qty({min_qty}).")
+                try:
+                    await bot.client.private_order_cancel(symbol=symbol, order_id=order_id)
+                    ORDERS.inc('cancelled')
+                except BybitAPIError as e:
+                    logger.warning(f'Failed to cancel order. order_id={order_id}, error={e}')
+                return filled_qty
+
+            if action == KEEP:
+                continue
+
+            order_qty = qty - done_qty
+            logger.info(f"Replace {side} order: symbol={symbol}, price={price}, qty={order_qty}, "
+                        f"leaves_qty={order['leaves_qty']}, order_id={order_id}")
+            params = _replace_params(symbol, order_id, order, price, order_qty)
+            if not bot.alive:
+                break
+            try:
+                order_id = (await bot.client.private_order_replace(**params))['order_id']
+                ORDERS.inc('replaced')
+            except BybitAPIError as e:
+                # filled or cancelled in the meantime, which the next loop sees
+                logger.warning(f'Failed to replace order. order_id={order_id}, error={e}')
+            REPRICE_SECONDS.observe(time.perf_counter() - t, side)
+
+        return done_qty
+
+
+def _exec_value(order: dict) -> float:
+    '''
+    Returns
+    -------
+    float
+        executed value in coin of the inverse perpetual order
+    '''
+    if order.get('cum_exec_value') is not None:
+        return float(order['cum_exec_value'])
+    return order['cum_exec_qty'] / float(order['price'])
+
+
+
+def _is_filled(order: dict) -> bool:
+    return order['order_status'] == 'Filled' and order['leaves_qty'] == 0
+
+
+def _next_action(order: dict, price, qty: int, done_qty: int, filled_qty: int, min_qty: int) -> str:
+    '''
+    Decide what a chase does with its order which is not filled yet.
+
+    Parameters
+    ----------
+    qty: int
+        total quantity of the chase
+    done_qty: int
+        quantity filled by the orders cancelled before this one
+    filled_qty: int
+        quantity filled including this order
+
+    Returns
+    -------
+    str
+        CREATE a new order for the quantity left after the order was cancelled,
+        STOP after it was cancelled with less than min_qty left,
+        CANCEL it because less than min_qty is left,
+        KEEP it at its price and quantity, or REPLACE it at the price
+    '''
+    if order['order_status'] in ('Cancelled', 'Rejected'):
+        return STOP if qty - filled_qty < min_qty else CREATE
+    if qty - filled_qty < min_qty:
+        return CANCEL
+    if float(order['price']) == float(price) and order['qty'] == qty - done_qty:
+        return KEEP
+    return REPLACE
+
+
+def _replace_params(symbol: str, order_id: str, order: dict, price, order_qty: int) -> dict:
+    params = {'symbol': symbol, 'order_id': order_id, 'p_r_price': price}
+    if order['qty'] != order_qty:
+        params['p_r_qty'] = order_qty
+    return params
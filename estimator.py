@@ -0,0 +1,187 @@
+'''
+Incremental estimate of the next funding rate from the premium index.
+
+Bybit sets the funding rate of a perpetual at each funding time from the
+premium index sampled every minute of the interval before it:
+
+    P = (1 * p_1 + 2 * p_2 + ... + n * p_n) / (1 + 2 + ... + n)
+    F = P + clamp(I - P, -0.05%, 0.05%)
+
+where p_k is the premium of the k-th minute and I the interest rate of
+the interval. The weighted sums of each symbol are updated with every
+sample, so the rate the current interval is heading to is a few array
+operations away at any moment, for any number of symbols.
+
+The premium is taken as (mark - index) / index of the tickers or of the
+instrument feed, which approximates the impact price premium Bybit samples.
+'''
+from threading import Lock
+import time
+
+import numpy as np
+
+from scheduler import DEFAULT_FUNDING_INTERVAL
+
+
+INTEREST_RATE = 0.0001
+'''interest rate of 8 hours'''
+
+CLAMP = 0.0005
+'''max difference between the interest rate and the premium applied to the funding rate'''
+
+
+class FundingRateEstimator(object):
+    '''
+    Predicts the funding rate of each symbol from the premium sampled
+    every minute of its funding interval.
+
+    The last premium received in a minute is the sample of the minute,
+    and carried forward over minutes without updates. Samples are also
+    kept in a fixed-size ring buffer of each symbol.
+
+    Parameters
+    ----------
+    intervals: dict
+        funding interval in minutes by symbol. DEFAULT_FUNDING_INTERVAL if missing.
+    capacity: int
+        minutes of premium kept in the ring buffer of each symbol
+    min_samples: int
+        minutes of the interval to sample before a rate is predicted
+    min_coverage: float
+        share of the weights of the minutes elapsed in the interval which
+        must be sampled before a rate is predicted. minutes missed at the
+        start of the interval, e.g. before the bot started, count less as
+        their weights are small.
+    '''
+
+    def __init__(self,
+                 symbols: list,
+                 intervals: dict = None,
+                 capacity: int = DEFAULT_FUNDING_INTERVAL,
+                 min_samples: int = 60,
+                 min_coverage: float = 0.9,
+                 interest_rate: float = INTEREST_RATE):
+        self.rows = {s: i for i, s in enumerate(symbols)}
+        self.capacity = capacity
+        self.min_samples = min_samples
+        self.min_coverage = min_coverage
+        n = len(symbols)
+        minutes = np.array([(intervals or {}).get(s, DEFAULT_FUNDING_INTERVAL) for s in symbols], dtype=float)
+        self.__interval = minutes * 60
+        self.__interest = interest_rate * minutes / (8 * 60)
+        self.__lock = Lock()
+        self.__ring = np.full((n, capacity), np.nan)
+        self.__head = np.zeros(n, dtype=np.int64)
+        # premium and minute of the latest update, which is not sampled until the minute ends
+        self.__latest = np.full(n, np.nan)
+        self.__minute = np.full(n, -1, dtype=np.int64)
+        # start of the interval summed, number of samples, sum of weights and weighted sum of premiums
+        self.__start = np.full(n, -1.0)
+        self.__n = np.zeros(n)
+        self.__w = np.zeros(n)
+        self.__wp = np.zeros(n)
+
+    def update(self, symbol: str, mark_price, index_price, ts: float = None) -> None:
+        i = self.rows.get(symbol)
+        index_price = float(index_price)
+        if i is None or not index_price:
+            return
+        premium = (float(mark_price) - index_price) / index_price
+        minute = int((time.time() if ts is None else ts) // 60)
+        with self.__lock:
+            last = self.__minute[i]
+            if minute < last:
+                return
+            if minute > last >= 0:
+                # every minute since the last update samples its premium
+                for m in range(max(last, minute - self.capacity), minute):
+                    self.__sample(i, m)
+            self.__latest[i] = premium
+            self.__minute[i] = minute
+
+    def update_tickers(self, tickers: list, ts: float = None) -> None:
+        '''
+        Parameters
+        ----------
+        tickers: list
+            tickers returned by public_tickers
+        '''
+        for t in tickers:
+            if t.get('mark_price') and t.get('index_price'):
+                self.update(t['symbol'], t['mark_price'], t['index_price'], ts)
+
+    def __sample(self, i: int, minute: int) -> None:
+        t = minute * 60
+        start = t - t % self.__interval[i]
+        if start != self.__start[i]:
+            self.__start[i] = start
+            self.__n[i] = self.__w[i] = self.__wp[i] = 0
+        p = self.__latest[i]
+        # the k-th minute of the interval weighs k, whichever minutes were sampled before
+        k = minute - start // 60 + 1
+        self.__n[i] += 1
+        self.__w[i] += k
+        self.__wp[i] += k * p
+        self.__ring[i, self.__head[i] % self.capacity] = p
+        self.__head[i] += 1
+
+    def predict(self, symbols: list = None, now: float = None) -> np.ndarray:
+        '''
+        Returns
+        -------
+        np.ndarray
+            predicted funding rate of each symbol, all symbols if None.
+            nan for symbols sampled less than min_samples minutes, or less
+            than min_coverage of the weights, in the interval.
+        '''
+        now = time.time() if now is None else now
+        rows = slice(None) if symbols is None else [self.rows[s] for s in symbols]
+        with self.__lock:
+            start = now - now % self.__interval[rows]
+            same = self.__start[rows] == start
+            n = np.where(same, self.__n[rows], 0)
+            w = np.where(same, self.__w[rows], 0)
+            wp = np.where(same, self.__wp[rows], 0)
+            latest = self.__latest[rows]
+            # the premium of the current minute counts as the next sample
+            minute = self.__minute[rows]
+            pending = (minute * 60 >= start) & ~np.isnan(latest)
+            interest = self.__interest[rows]
+        k = minute - start // 60 + 1
+        n = n + pending
+        w = w + np.where(pending, k, 0)
+        wp = wp + np.where(pending, k * np.nan_to_num(latest), 0)
+        # sum of the weights of the minutes elapsed, including the current one
+        elapsed = now // 60 - start // 60 + 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            p = wp / w
+            coverage = w / (elapsed * (elapsed + 1) / 2)
+        fr = p + np.clip(interest - p, -CLAMP, CLAMP)
+        return np.where((n >= self.min_samples) & (coverage >= self.min_coverage), fr, np.nan)
+
+    def predicted_rate(self, symbol: str, now: float = None) -> float:
+        '''
+        Returns
+        -------
+        float
+            predicted funding rate of the symbol, or None if not sampled enough
+        '''
+        if symbol not in self.rows:
+            return None
+        fr = float(self.predict([symbol], now)[0])
+        return None if np.isnan(fr) else fr
+
+    def premiums(self, symbol: str) -> np.ndarray:
+        '''
+        Returns
+        -------
+        np.ndarray
+            premiums of the last `capacity` minutes sampled, oldest first
+        '''
+        i = self.rows[symbol]
+        with self.__lock:
+            head = int(self.__head[i])
+            ring = self.__ring[i].copy()
+        if head <= self.capacity:
+            return ring[:head]
+        return np.roll(ring, -(head % self.capacity))
@@ -0,0 +1,26 @@
+'''
+JSON backend of the api and stream clients.
+
+orjson is used if it is installed (pip install orjson), which parses
+response bodies directly from bytes, skipping the decode to str.
+Otherwise falls back to the standard json module.
+'''
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+BACKEND = 'orjson' if orjson else 'json'
+
+
+if orjson:
+    loads = orjson.loads
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+else:
+    loads = json.loads
+    dumps = json.dumps
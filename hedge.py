@@ -0,0 +1,540 @@
+'''
+Execution of hedged entries whose legs are on different markets, e.g. a
+short USDT perpetual hedged by a spot buy of the same coin.
+
+    python hedge.py --leg linear:BTCUSDT:Sell --leg spot:BTCUSDT:Buy --coin 0.01 --tolerance 0.002
+'''
+from logging import getLogger
+from threading import Condition, Thread
+from typing import NamedTuple
+import argparse
+import math
+import os
+import time
+
+from api import BybitAPIError, InversePerp, LinearPerp, Spot
+from chaser import _exec_value
+from constants import ORDER_TYPE_LIMIT, ORDER_TYPE_LIMIT_MAKER
+from log import error_message
+from metrics import DURATION_BUCKETS, Histogram
+from models import Order
+from orders import ORDER_TIMEOUT, ORDERS, OrderManager
+from scheduler import next_funding_time
+from transport import CircuitBreaker, RetryPolicy
+
+
+logger = getLogger('frbot')
+
+
+HEDGE_SECONDS = Histogram('frbot_hedge_seconds', 'Seconds from the first orders to the end of a hedged entry.',
+                          buckets=DURATION_BUCKETS)
+LEG_LAG_SECONDS = Histogram('frbot_hedge_leg_lag_seconds',
+                            'Seconds between the first and the last leg of a hedge reaching a stage, '
+                            'i.e. first_fill or filled.', ('stage',), buckets=DURATION_BUCKETS)
+
+
+class LegOrder(NamedTuple):
+    '''
+    Order of a leg. qty and cum_qty are in the unit of the leg, filled in coin.
+    '''
+    order_id: str
+    is_open: bool
+    price: str
+    qty: float
+    cum_qty: float
+    filled: float
+
+
+class Leg(object):
+    '''
+    One side of a hedge on one market.
+
+    The quantities of a leg are in its own unit, which is converted from
+    and to coin so that the executor can compare the exposure of the legs.
+
+    Parameters
+    ----------
+    side: str
+        Buy or Sell
+    qty_step: float
+        quantities are rounded down to a multiple of this
+    min_qty: float
+        minimum quantity of an order
+    '''
+
+    def __init__(self, symbol: str, side: str, qty_step: float = 1, min_qty: float = 1):
+        self.symbol = symbol
+        self.side = side
+        self.sign = 1 if side == 'Buy' else -1
+        self.qty_step = qty_step
+        self.min_qty = min_qty
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.symbol}, {self.side})'
+
+    def to_qty(self, coin: float, price) -> float:
+        '''
+        Returns
+        -------
+        float
+            quantity of the leg exposed to the coin at the price, rounded down
+        '''
+        return _round_down(coin, self.qty_step)
+
+    def best_price(self, taker: bool = False) -> str:
+        '''
+        Returns
+        -------
+        str
+            best price to make an order at, or to take one at if taker
+        '''
+        raise NotImplementedError
+
+    def create(self, qty: float, price: str, taker: bool = False) -> str:
+        '''
+        Create a PostOnly order, or an ImmediateOrCancel one if taker.
+
+        Returns
+        -------
+        str
+            order id
+        '''
+        raise NotImplementedError
+
+    def order(self, order_id: str) -> LegOrder:
+        raise NotImplementedError
+
+    def amend(self, order: LegOrder, price: str, leaves: float) -> str:
+        '''
+        Reprice the order and resize the quantity left to fill.
+
+        Returns
+        -------
+        str
+            id of the amended order, or None if the market has no amendment
+            and the order was cancelled instead
+        '''
+        raise NotImplementedError
+
+    def cancel(self, order_id: str) -> None:
+        raise NotImplementedError
+
+
+class InversePerpLeg(Leg):
+    '''
+    Leg on an inverse perpetual, whose quantity is in US dollar.
+
+    Orders go through the OrderManager and prices come from MarketData of
+    the bot if given, otherwise straight from the client.
+    '''
+
+    def __init__(self, client: InversePerp, symbol: str, side: str, min_qty: int = 1,
+                 orders: OrderManager = None, market=None):
+        super().__init__(symbol, side, 1, min_qty)
+        self.client = client
+        self.orders = orders
+        self.market = market
+
+    def to_qty(self, coin: float, price) -> int:
+        return int(coin * float(price))
+
+    def best_price(self, taker: bool = False) -> str:
+        side = _opposite(self.side) if taker else self.side
+        if self.market:
+            return self.market.best_price(self.symbol, side)
+        return _best_l2(self.client.public_orderbook_l2(self.symbol), side)
+
+    def create(self, qty: int, price: str, taker: bool = False) -> str:
+        params = {'symbol': self.symbol, 'side': self.side, 'order_type': 'Limit', 'qty': int(qty), 'price': price,
+                  'time_in_force': 'ImmediateOrCancel' if taker else 'PostOnly'}
+        if self.orders:
+            return self.orders.create(**params).result(ORDER_TIMEOUT)['order_id']
+        ORDERS.inc('created')
+        return self.client.private_order_create(**params)['order_id']
+
+    def order(self, order_id: str) -> LegOrder:
+        o = Order.from_dict(self.client.private_order(symbol=self.symbol, order_id=order_id))
+        return LegOrder(order_id, o.order_status not in _FINAL_STATUS, o.price, o.qty, o.cum_exec_qty,
+                        _exec_value(o))
+
+    def amend(self, order: LegOrder, price: str, leaves: int) -> str:
+        params = {'symbol': self.symbol, 'order_id': order.order_id, 'p_r_price': price,
+                  'p_r_qty': int(order.cum_qty + leaves)}
+        if self.orders:
+            return self.orders.replace(**params).result(ORDER_TIMEOUT)['order_id']
+        ORDERS.inc('replaced')
+        return self.client.private_order_replace(**params)['order_id']
+
+    def cancel(self, order_id: str) -> None:
+        if self.orders:
+            self.orders.cancel(symbol=self.symbol, order_id=order_id).result(ORDER_TIMEOUT)
+            return
+        ORDERS.inc('cancelled')
+        self.client.private_order_cancel(symbol=self.symbol, order_id=order_id)
+
+
+class LinearPerpLeg(Leg):
+    '''
+    Leg on a USDT perpetual, whose quantity is in coin.
+    '''
+
+    def __init__(self, client: LinearPerp, symbol: str, side: str, qty_step: float, min_qty: float):
+        super().__init__(symbol, side, qty_step, min_qty)
+        self.client = client
+
+    def best_price(self, taker: bool = False) -> str:
+        return _best_l2(self.client.public_orderbook_l2(self.symbol), _opposite(self.side) if taker else self.side)
+
+    def create(self, qty: float, price: str, taker: bool = False) -> str:
+        ORDERS.inc('created')
+        res = self.client.private_linear_order_create(symbol=self.symbol, side=self.side, order_type='Limit',
+                                                      qty=_fmt(qty), price=price,
+                                                      time_in_force='ImmediateOrCancel' if taker else 'PostOnly')
+        return res['order_id']
+
+    def order(self, order_id: str) -> LegOrder:
+        o = self.client.private_linear_order_search(symbol=self.symbol, order_id=order_id)
+        cum_qty = float(o['cum_exec_qty'])
+        return LegOrder(order_id, o['order_status'] not in _FINAL_STATUS, str(o['price']), float(o['qty']),
+                        cum_qty, cum_qty)
+
+    def amend(self, order: LegOrder, price: str, leaves: float) -> str:
+        ORDERS.inc('replaced')
+        res = self.client.private_linear_order_replace(symbol=self.symbol, order_id=order.order_id,
+                                                       p_r_price=price, p_r_qty=_fmt(order.cum_qty + leaves))
+        return res['order_id']
+
+    def cancel(self, order_id: str) -> None:
+        ORDERS.inc('cancelled')
+        self.client.private_linear_order_cancel(symbol=self.symbol, order_id=order_id)
+
+
+class SpotLeg(Leg):
+    '''
+    Leg on a spot market, whose quantity is in the base coin.
+    The spot api has no amendment, so an order is repriced by cancelling it.
+    '''
+
+    def __init__(self, client: Spot, symbol: str, side: str, qty_step: float, min_qty: float):
+        super().__init__(symbol, side, qty_step, min_qty)
+        self.client = client
+
+    def best_price(self, taker: bool = False) -> str:
+        book = self.client.spot_quote_depth(self.symbol, limit=1)
+        buy = (self.side == 'Buy') != taker
+        return book['bids' if buy else 'asks'][0][0]
+
+    def create(self, qty: float, price: str, taker: bool = False) -> str:
+        ORDERS.inc('created')
+        res = self.client.spot_order_create(symbol=self.symbol,
+                                            side=self.side.upper(),
+                                            order_type=ORDER_TYPE_LIMIT if taker else ORDER_TYPE_LIMIT_MAKER,
+                                            qty=_fmt(qty),
+                                            price=price,
+                                            time_in_force='IOC' if taker else None)
+        return res['orderId']
+
+    def order(self, order_id: str) -> LegOrder:
+        o = self.client.spot_order(order_id=order_id)
+        cum_qty = float(o['executedQty'])
+        return LegOrder(order_id, o['status'] not in _SPOT_FINAL_STATUS, o['price'], float(o['origQty']),
+                        cum_qty, cum_qty)
+
+    def amend(self, order: LegOrder, price: str, leaves: float) -> str:
+        self.cancel(order.order_id)
+
+    def cancel(self, order_id: str) -> None:
+        ORDERS.inc('cancelled')
+        self.client.spot_order_cancel(order_id=order_id)
+
+
+class HedgeResult(NamedTuple):
+    filled: tuple
+    '''coin filled by each leg'''
+    delta: float
+    '''net exposure in coin left by the legs'''
+    max_delta: float
+    '''largest net exposure in coin while the legs were filled'''
+    complete: bool
+    '''whether every leg filled the whole quantity'''
+
+
+class HedgeExecutor(object):
+    '''
+    Places and chases the legs of a hedge concurrently, keeping their net
+    exposure within a tolerance while they are partially filled.
+
+    Each leg works one PostOnly order at its best price, sized so that a
+    full fill leaves it at most `tolerance` coin ahead of the least filled
+    other leg. A leg reaching that limit pauses until the others catch up,
+    and is woken as soon as they fill, so the legs progress together in
+    steps of the tolerance.
+
+    At the deadline the orders left are cancelled, and an imbalance beyond
+    the tolerance, e.g. of a fill racing a cancel, is closed by the lagging
+    legs with taker orders. The entry is then complete, or hedged at the
+    size filled so far, before the funding time it was made for.
+
+    Parameters
+    ----------
+    poll_interval: float
+        seconds between polls of the orders of a leg
+    store: Store
+        keeps the order events of the legs if given
+    '''
+
+    def __init__(self, poll_interval: float = 1.0, store=None):
+        self.poll_interval = poll_interval
+        self.store = store
+        self.alive = True
+
+    def stop(self) -> None:
+        '''
+        Stop the running executions, which cancel their orders.
+        '''
+        self.alive = False
+
+    def execute(self, legs: list, coin: float, tolerance: float, deadline: float) -> HedgeResult:
+        '''
+        Parameters
+        ----------
+        legs: list
+            Leg of each market
+        coin: float
+            exposure in coin to fill with each leg
+        tolerance: float
+            max net exposure in coin while the legs are partially filled
+        deadline: float
+            unix time to stop chasing, e.g. a little before the next funding time
+        '''
+        logger.info(f'Start hedged entry: legs={legs}, coin={coin}, tolerance={tolerance}')
+        return _Execution(self, legs, coin, tolerance, deadline).run()
+
+
+class _Execution(object):
+
+    def __init__(self, executor: HedgeExecutor, legs: list, coin: float, tolerance: float, deadline: float):
+        self.executor = executor
+        self.legs = legs
+        self.coin = coin
+        self.tolerance = tolerance
+        self.deadline = deadline
+        self.cond = Condition()
+        self.filled = [0.0] * len(legs)
+        self.first_fill = [None] * len(legs)
+        self.done = [None] * len(legs)
+        self.max_delta = 0.0
+
+    def alive(self) -> bool:
+        return self.executor.alive and time.time() < self.deadline
+
+    def run(self) -> HedgeResult:
+        start = time.perf_counter()
+        threads = [Thread(target=self.chase, args=(i,), name=f'hedge-{leg.symbol}') for i, leg in enumerate(self.legs)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if abs(self.delta()) > self.tolerance:
+            self.rebalance()
+        HEDGE_SECONDS.observe(time.perf_counter() - start)
+        if all(self.first_fill):
+            LEG_LAG_SECONDS.observe(max(self.first_fill) - min(self.first_fill), 'first_fill')
+        if all(self.done):
+            LEG_LAG_SECONDS.observe(max(self.done) - min(self.done), 'filled')
+
+        result = HedgeResult(tuple(self.filled), self.delta(), self.max_delta, all(self.done))
+        logger.info(f'Finished hedged entry: {result}')
+        return result
+
+    def delta(self) -> float:
+        return sum(leg.sign * f for leg, f in zip(self.legs, self.filled))
+
+    def chase(self, i: int) -> None:
+        leg = self.legs[i]
+        order = None
+        # coin filled by the orders finished so far
+        done = 0.0
+        try:
+            while self.alive():
+                try:
+                    filled = done
+                    if order:
+                        order = leg.order(order.order_id)
+                        filled = done + order.filled
+                        if not order.is_open:
+                            self.record(_final_event(order), leg, order)
+                            done, order = filled, None
+                    self.update(i, filled)
+
+                    price = leg.best_price()
+                    if leg.to_qty(self.coin - filled, price) < leg.min_qty:
+                        if self.done[i] is None:
+                            self.done[i] = time.perf_counter()
+                        if order:
+                            leg.cancel(order.order_id)
+                            continue
+                        logger.info(f'Leg was filled: {leg}, filled={filled}')
+                        return
+
+                    leaves = leg.to_qty(self.allowed(i), price)
+                    if order is None:
+                        if leaves >= leg.min_qty:
+                            order_id = leg.create(leaves, price)
+                            order = LegOrder(order_id, True, price, leaves, 0, 0.0)
+                            self.record('created', leg, order)
+                    elif leaves < leg.min_qty:
+                        logger.info(f'Pause leg until the others catch up: {leg}, filled={filled}')
+                        leg.cancel(order.order_id)
+                    elif float(price) != float(order.price) or self.resize(leg, order, leaves):
+                        if leg.amend(order, price, leaves):
+                            self.record('replaced', leg, order._replace(price=price, qty=order.cum_qty + leaves))
+                except Exception as e:
+                    # filled or cancelled in the meantime, or a failed request, which the next loop retries
+                    logger.warning(f'Failed to update leg: {leg}, error={error_message(e)}')
+                self.wait()
+        finally:
+            # the order is cancelled even if the thread fails, not to leave the legs unhedged
+            if order:
+                self.finish(i, order, done)
+
+    def resize(self, leg: Leg, order: LegOrder, leaves: float) -> bool:
+        '''
+        Whether to amend the quantity of the order, which shrinks it at once to
+        keep within the tolerance, and grows it only by the minimum quantity.
+        '''
+        current = order.qty - order.cum_qty
+        return leaves < current - leg.qty_step / 2 or leaves >= current + leg.min_qty
+
+    def finish(self, i: int, order: LegOrder, done: float) -> None:
+        leg = self.legs[i]
+        try:
+            leg.cancel(order.order_id)
+        except Exception as e:
+            logger.warning(f'Failed to cancel order of leg: {leg}, error={error_message(e)}')
+        try:
+            order = leg.order(order.order_id)
+        except Exception as e:
+            logger.error(f'Failed to get the final state of the order of leg: {leg}, order_id={order.order_id}, error={error_message(e)}')
+            return
+        self.record(_final_event(order), leg, order)
+        self.update(i, done + order.filled)
+
+    def rebalance(self) -> None:
+        lead = max(self.filled)
+        for i, leg in enumerate(self.legs):
+            price = leg.best_price(taker=True)
+            qty = leg.to_qty(lead - self.filled[i], price)
+            if qty < leg.min_qty:
+                continue
+            logger.info(f'Take {qty} of {leg} to close the imbalance of the legs.')
+            try:
+                order = leg.order(leg.create(qty, price, taker=True))
+                while order.is_open:
+                    time.sleep(0.1)
+                    order = leg.order(order.order_id)
+            except BybitAPIError as e:
+                logger.warning(f'Failed to rebalance leg: {leg}, error={error_message(e)}')
+                continue
+            self.record(_final_event(order), leg, order)
+            self.update(i, self.filled[i] + order.filled)
+
+    def allowed(self, i: int) -> float:
+        '''
+        Returns
+        -------
+        float
+            coin the leg can fill with its order, keeping within the
+            tolerance of the least filled other leg
+        '''
+        with self.cond:
+            others = min((f for j, f in enumerate(self.filled) if j != i), default=self.coin)
+            return max(0.0, min(self.coin, others + self.tolerance) - self.filled[i])
+
+    def update(self, i: int, filled: float) -> None:
+        with self.cond:
+            if filled == self.filled[i]:
+                return
+            if self.first_fill[i] is None:
+                self.first_fill[i] = time.perf_counter()
+            self.filled[i] = filled
+            self.max_delta = max(self.max_delta, abs(self.delta()))
+            self.cond.notify_all()
+
+    def wait(self) -> None:
+        '''
+        Block until a leg is filled more, or poll_interval elapses.
+        '''
+        with self.cond:
+            self.cond.wait(self.executor.poll_interval)
+
+    def record(self, event: str, leg: Leg, order: LegOrder) -> None:
+        if event == 'filled':
+            ORDERS.inc('filled')
+        if self.executor.store:
+            self.executor.store.add_order_event(event, leg.symbol, order.order_id, leg.side,
+                                                order.price, order.qty, order.cum_qty)
+
+
+_FINAL_STATUS = ('Filled', 'Cancelled', 'Rejected', 'Deactivated')
+_SPOT_FINAL_STATUS = ('FILLED', 'CANCELED', 'REJECTED')
+
+
+def _final_event(order: LegOrder) -> str:
+    return 'filled' if order.cum_qty >= order.qty else 'cancelled'
+
+
+def _opposite(side: str) -> str:
+    return 'Sell' if side == 'Buy' else 'Buy'
+
+
+def _best_l2(book: list, side: str) -> str:
+    return next(r for r in book if r['side'] == side)['price']
+
+
+def _round_down(qty: float, step: float) -> float:
+    # the epsilon keeps a quantity which is a multiple of the step in float
+    return round(math.floor(qty / step + 1e-9) * step, 10)
+
+
+def _fmt(qty: float) -> str:
+    return f'{qty:.10f}'.rstrip('0').rstrip('.')
+
+
+def build_leg(spec: str, key: str, secret: str, test: bool) -> Leg:
+    '''
+    Parameters
+    ----------
+    spec: str
+        market:symbol:side, e.g. inverse:BTCUSD:Sell, linear:BTCUSDT:Sell or spot:BTCUSDT:Buy
+    '''
+    market, symbol, side = spec.split(':')
+    # transient errors are retried by the client, and the chase loops retry the others
+    kwargs = {'retry': RetryPolicy(), 'breaker': CircuitBreaker()}
+    if market == 'spot':
+        client = Spot(key, secret, test, **kwargs)
+        s = next(s for s in client.spot_symbols() if s['name'] == symbol)
+        return SpotLeg(client, symbol, side, float(s['basePrecision']), float(s['minTradeQuantity']))
+    client = (InversePerp if market == 'inverse' else LinearPerp)(key, secret, test, **kwargs)
+    lot = next(s for s in InversePerp('', '', test, **kwargs).public_symbols() if s['name'] == symbol)['lot_size_filter']
+    if market == 'inverse':
+        return InversePerpLeg(client, symbol, side, lot['min_trading_qty'])
+    return LinearPerpLeg(client, symbol, side, float(lot['qty_step']), float(lot['min_trading_qty']))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Enter a hedged position before the next funding time.')
+    parser.add_argument('--leg', action='append', required=True, help='market:symbol:side of each leg')
+    parser.add_argument('--coin', type=float, required=True, help='exposure in coin of each leg')
+    parser.add_argument('--tolerance', type=float, required=True, help='max net exposure in coin')
+    parser.add_argument('--lead', type=float, default=60, help='seconds before the funding time to stop')
+    args = parser.parse_args()
+
+    test = os.environ['BYBIT_TEST'].lower() == 'true'
+    legs = [build_leg(spec, os.environ['BYBIT_APIKEY'], os.environ['BYBIT_SECRET'], test) for spec in args.leg]
+    deadline = next_funding_time(time.time()) - args.lead
+    print(HedgeExecutor().execute(legs, args.coin, args.tolerance, deadline))
+
+
+if __name__ == '__main__':
+    main()
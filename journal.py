@@ -0,0 +1,112 @@
+from logging import getLogger
+from threading import Lock
+import json
+import os
+import time
+
+
+logger = getLogger(__name__)
+
+
+class Journal(object):
+    '''
+    Append-only journal of the state a restarted bot needs to resume:
+    the order each chase is working on, its target quantity and progress,
+    and the funding time each window job last completed for a symbol.
+
+    Each record is one json line synced to disk before the call returns.
+    The journal is replayed on open, ignoring a line torn by a crash,
+    and rewritten as a snapshot when it grows beyond `compact_at` lines.
+
+    Parameters
+    ----------
+    path: str
+        file of the journal. parent directories are created.
+    '''
+
+    def __init__(self, path: str, compact_at: int = 10000):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.compact_at = compact_at
+        self.__lock = Lock()
+        self.__chases = {}
+        self.__windows = {}
+        self.__replay()
+        self.__compact()
+
+    def chase(self, symbol: str, **state) -> None:
+        '''
+        Record the state of the chase of the symbol, i.e. side, qty, min_qty,
+        order_id, done_qty and done_value.
+        '''
+        self.__append({'op': 'chase', 'symbol': symbol, 'ts': time.time(), **state})
+
+    def chase_done(self, symbol: str) -> None:
+        self.__append({'op': 'chase_done', 'symbol': symbol})
+
+    def window_done(self, job: str, symbol: str, funding_time: float) -> None:
+        self.__append({'op': 'window', 'job': job, 'symbol': symbol, 'funding_time': funding_time})
+
+    def chases(self) -> dict:
+        '''
+        Returns
+        -------
+        dict
+            state of the unfinished chases by symbol
+        '''
+        with self.__lock:
+            return {s: dict(c) for s, c in self.__chases.items()}
+
+    def window_time(self, job: str, symbol: str) -> float:
+        '''
+        Returns
+        -------
+        float
+            funding time of the window in which the job last completed for the symbol
+        '''
+        return self.__windows.get(f'{job}.{symbol}')
+
+    def __apply(self, r: dict) -> None:
+        if r['op'] == 'chase':
+            self.__chases[r['symbol']] = {k: v for k, v in r.items() if k != 'op'}
+        elif r['op'] == 'chase_done':
+            self.__chases.pop(r['symbol'], None)
+        elif r['op'] == 'window':
+            self.__windows[f"{r['job']}.{r['symbol']}"] = r['funding_time']
+
+    def __replay(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    self.__apply(json.loads(line))
+                except ValueError:
+                    logger.warning(f'Ignored a broken line of {self.path}: {line!r}')
+        logger.info(f'Loaded journal: chases={list(self.__chases)}')
+
+    def __compact(self) -> None:
+        records = [{'op': 'chase', **c} for c in self.__chases.values()]
+        for key, t in self.__windows.items():
+            job, symbol = key.split('.', 1)
+            records.append({'op': 'window', 'job': job, 'symbol': symbol, 'funding_time': t})
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            f.writelines(json.dumps(r) + '\n' for r in records)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.__file = open(self.path, 'a')
+        self.__lines = len(records)
+
+    def __append(self, record: dict) -> None:
+        with self.__lock:
+            self.__apply(record)
+            self.__file.write(json.dumps(record) + '\n')
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+            self.__lines += 1
+            if self.__lines > self.compact_at:
+                self.__file.close()
+                self.__compact()
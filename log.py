@@ -0,0 +1,132 @@
+from logging import Formatter, LogRecord, config, getLogger
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+import atexit
+import copy
+import json
+import os
+import re
+import time
+import traceback as tb
+
+
+_RECORD_ATTRS = set(vars(LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_URL_QUERY = re.compile(r'\?[^\s\'"]+')
+
+
+def error_message(e: BaseException, traceback: bool = False) -> str:
+    '''
+    Returns
+    -------
+    str
+        message of the error, following its traceback if traceback.
+        query strings of urls are removed, as those of signed requests
+        hold the api key and the signature.
+    '''
+    text = ''.join(tb.format_exception(type(e), e, e.__traceback__)) if traceback else str(e)
+    return _URL_QUERY.sub('?<redacted>', text)
+
+
+class JsonFormatter(Formatter):
+    '''
+    Formats a record as one json line.
+
+    Attributes given by `extra` are written as fields of their own.
+    '''
+
+    def format(self, record: LogRecord) -> str:
+        d = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'src': f'{record.filename}:{record.lineno}',
+            'msg': record.getMessage(),
+        }
+        for k, v in vars(record).items():
+            if k not in _RECORD_ATTRS:
+                d[k] = v
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            d['exc'] = record.exc_text
+        return json.dumps(d, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    '''
+    Puts records on the queue without formatting them.
+
+    The message is merged with its arguments here, so that it tells their
+    state at the call even if they are mutated later, and the traceback is
+    rendered because it can not outlive the caller's frame. Formatting by
+    the handlers, e.g. into json lines, is left to the listener thread.
+    '''
+
+    def prepare(self, record: LogRecord) -> LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(path: str = 'logging.conf', fmt: str = None) -> None:
+    '''
+    Configure logging from the file, then move the handlers of each logger
+    behind a queue drained by a background thread, so that logging threads
+    never wait on disk or stderr.
+
+    Parameters
+    ----------
+    fmt: str
+        "json" to write json lines. defaults to $LOG_FORMAT, or the
+        formatters of the file if unset.
+    '''
+    config.fileConfig(path, disable_existing_loggers=False)
+    fmt = fmt or os.environ.get('LOG_FORMAT', 'text')
+
+    queue = SimpleQueue()
+    handlers = []
+    for logger in [getLogger()] + [getLogger(n) for n in getLogger().manager.loggerDict]:
+        if not getattr(logger, 'handlers', None):
+            continue
+        for h in logger.handlers:
+            if fmt == 'json':
+                h.setFormatter(JsonFormatter())
+            handlers.append((logger.name, h))
+        logger.handlers = [_RoutingQueueHandler(queue, logger.name)]
+
+    listener = _RoutingQueueListener(queue, handlers)
+    listener.start()
+    atexit.register(listener.stop)
+
+
+class _RoutingQueueHandler(LazyQueueHandler):
+
+    def __init__(self, queue, name: str):
+        super().__init__(queue)
+        self.__name = name
+
+    def enqueue(self, record: LogRecord) -> None:
+        self.queue.put_nowait((self.__name, record))
+
+
+class _RoutingQueueListener(QueueListener):
+    '''
+    Dispatches each record only to the handlers of the logger it was queued by,
+    as the logging hierarchy would have done.
+    '''
+
+    def __init__(self, queue, handlers: list):
+        super().__init__(queue, *[h for _, h in handlers])
+        self.__handlers = handlers
+
+    def handle(self, item) -> None:
+        name, record = item
+        for n, h in self.__handlers:
+            if n == name and record.levelno >= h.level:
+                h.handle(record)
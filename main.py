@@ -1,219 +1,329 @@
 import sys
-import json
 import signal
 import os
 import time
+from concurrent.futures import TimeoutError
 from datetime import datetime, timezone
-from logging import config, getLogger
-from threading import Thread
-
-import requests
+from logging import getLogger
+from threading import Event, Thread
 
 from constants import *
+from log import error_message, setup_logging
+from notifier import SlackNotifier
 from api import InversePerp, BybitAPIError
+from cache import FILL_INVALIDATED_PATHS, TTLCache
+from chaser import OrderChaser
+from journal import Journal
+from market import MarketData
+from metrics import DURATION_BUCKETS, Histogram, start_http_server
+from models import Balance, Order, Position
+from orders import ORDER_TIMEOUT, OrderManager
+from ratelimit import PRIORITY_LOW, RateLimiter, priority
+from scanner import UniverseScanner
+from scheduler import DEFAULT_FUNDING_INTERVAL, Scheduler, next_funding_time
+from store import Store
+from strategy import should_enter, should_exit
+from stream import PrivateStream
+from transport import CircuitBreaker, RetryPolicy
+
+
+setup_logging('logging.conf')
+logger = getLogger('frbot')
 
+MIN_REPRICE_INTERVAL = 1
+'''min seconds between iterations of the order chasing loops'''
 
-config.fileConfig( 'logging.conf', disable_existing_loggers=False)
-logger = getLogger('frbot')
+MAINTENANCE_LEAD = 5 * 60
+'''seconds before a funding time to maintain positions'''
+
+ENTRY_DELAY = 60
+'''seconds after a funding time to create short positions'''
+
+ENTRY_WINDOW = 10 * 60
+'''seconds after a funding time in which a starting bot still creates positions'''
+
+PREWARM_LEAD = 30
+'''seconds before maintenance to open connections and fill caches'''
+
+STORE_DIR = os.environ.get('STORE_DIR', 'data')
+'''directory of the history databases of the accounts'''
+
+CANCEL_ON_EXIT = os.environ.get('CANCEL_ON_EXIT', 'true').lower() == 'true'
+'''cancel all orders on SIGTERM/SIGINT. set false to resume them after a redeploy'''
+
+STOP_TIMEOUT = 30
+'''seconds to wait for the running chases to stop before cancelling all orders'''
+
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9100))
+'''local port serving the metrics at /metrics, disabled if 0'''
+
+USE_PREDICTED_FR = os.environ.get('USE_PREDICTED_FR', 'true').lower() == 'true'
+'''decide entries and exits from the funding rate predicted from the premium index when it is available'''
+
+WINDOW_SECONDS = Histogram('frbot_window_seconds', 'Seconds taken by the jobs of a funding window.',
+                           ('job',), buckets=DURATION_BUCKETS)
+
+
+notifier = SlackNotifier(os.environ.get('SLACK_WEBHOOK_URL'))
 
 
 def send_message(msg):
-    if os.environ['SLACK_WEBHOOK_URL']:
-        requests.post(os.environ['SLACK_WEBHOOK_URL'], data=json.dumps({'text': msg}))
+    notifier.send(msg)
 
 
 class FundingRateBot():
 
-    def __init__(self, api_key: str, api_secret: str, test: bool = True):
+    def __init__(self,
+                 api_key: str,
+                 api_secret: str,
+                 test: bool = True,
+                 symbols: list = INV_PERP_SYMBOLS,
+                 base_url: str = None,
+                 latency_hook=None,
+                 market: MarketData = None,
+                 name: str = None,
+                 max_symbols: int = None,
+                 store: Store = None,
+                 journal: Journal = None,
+                 persistent_cache: bool = True):
+        '''
+        Parameters
+        ----------
+        symbols: list
+            symbols to trade. all inverse perpetuals listed on Bybit if None.
+        max_symbols: int
+            if given, positions are created only for the best max_symbols
+            symbols picked by UniverseScanner at the start of each window.
+        market: MarketData
+            public market data shared with the bots of other accounts.
+            the bot creates its own if None.
+        name: str
+            name of the account prefixed to slack messages
+        store: Store
+            keeps the history of funding rates, orders, fills and balances if given
+        journal: Journal
+            keeps the state of chases and windows to resume them after a restart if given
+        persistent_cache: bool
+            save responses on disk to warm up the next start. disable for a mock exchange.
+        '''
         self.test = test
+        self.name = name
         self.alive = True
         self.min_entry_fr: float = 0.0000
         self.min_exit_fr: float = 0.0000
-        self.client = InversePerp(api_key, api_secret, test)
-        self.perp_symbols = {s['name']: s for s in self.client.public_symbols()}
+        self.poll_interval: float = 20
+        self.min_reprice_interval: float = MIN_REPRICE_INTERVAL
+        self.prewarm_lead: float = PREWARM_LEAD
+        self.scheduler = Scheduler()
+        self.market = market or MarketData(symbols, test, base_url, latency_hook, persistent_cache)
+        self.perp_symbols = self.market.perp_symbols
+        if symbols is None:
+            symbols = self.market.symbols
+        self.symbols = symbols
+        self.scanner = UniverseScanner(self.market, max_symbols) if max_symbols else None
+        self.selected = set() if self.scanner else set(symbols)
+        self.store = store
+        self.journal = journal
+        self.cancel_on_exit = CANCEL_ON_EXIT
+        self.use_predicted_fr = USE_PREDICTED_FR
+        self.resumed = {}
+        self.client = InversePerp(api_key, api_secret, test,
+                                  base_url=base_url,
+                                  pool_size=max(10, len(symbols) * 2),
+                                  latency_hook=latency_hook,
+                                  rate_limiter=RateLimiter(),
+                                  cache=TTLCache() if persistent_cache else TTLCache(persistent=set()),
+                                  retry=RetryPolicy(),
+                                  breaker=CircuitBreaker())
+        self.orders = OrderManager(self.client)
+        self.chaser = OrderChaser(self)
+        self.private = PrivateStream(api_key, api_secret, test)
+        self.updates = {s: Event() for s in symbols}
+        self.market.add_listener(self.__on_update)
+        self.private.add_listener(self.__on_update)
+        self.private.add_execution_listener(self.__on_execution)
         self.alive = True
 
+    def __on_update(self, symbol: str) -> None:
+        if symbol in self.updates:
+            self.updates[symbol].set()
+
+    def __on_execution(self, execution: dict) -> None:
+        self.client.cache.invalidate(*FILL_INVALIDATED_PATHS)
+        if self.store:
+            self.store.add_fill(execution)
+
+    def wait_update(self, symbol: str) -> None:
+        '''
+        Block until the order, position or best price of the symbol changes,
+        or poll_interval elapses.
+        '''
+        time.sleep(self.min_reprice_interval)
+        self.updates[symbol].wait(self.poll_interval)
+        self.updates[symbol].clear()
+
+    def get_order(self, symbol: str, order_id: str) -> Order:
+        order = self.private.order(order_id)
+        if order:
+            return order
+        logger.info(f'Get active order: order_id={order_id}')
+        order = Order.from_dict(self.client.private_order(symbol=symbol, order_id=order_id))
+        if order.cum_exec_qty:
+            # the execution may have been missed by the private stream
+            self.client.cache.invalidate(*FILL_INVALIDATED_PATHS)
+        return order
+
     def get_perp_best_price(self, symbol: str, side: str) -> str:
-        res = self.client.public_orderbook_l2(symbol)
-        best = [r for r in res if r['side'] == side][0]
-        name = 'Bid' if side == 'Buy' else 'Ask'
-        logger.info(f"Best {name} of {best['symbol']}: price={best['price']}, size={best['size']}")
-        return best['price']
+        return self.market.best_price(symbol, side)
+
+    def notify(self, msg: str) -> None:
+        send_message(f'[{self.name}] {msg}' if self.name else msg)
 
     def create_invperp_order(self, symbol: str, side: str, usdqty: int, price: float) -> str:
         logger.info(f'Create an invert perpetual order to {side.lower()} {symbol}. qty={usdqty}, price={price}')
-        res = self.client.private_order_create(symbol=symbol,
-                                                side=side,
-                                                order_type='Limit',
-                                                qty=usdqty,
-                                                price=price,
-                                                time_in_force='PostOnly')
+        res = self.orders.create(symbol=symbol,
+                                 side=side,
+                                 order_type='Limit',
+                                 qty=usdqty,
+                                 price=price,
+                                 time_in_force='PostOnly').result(ORDER_TIMEOUT)
         return res['order_id']
 
     def create_perp_short(self, symbol: str):
         logger.info(f"Start to create short position of {symbol}")
 
-        # create new sell order
+        # the balance is fetched once, and the quantity follows the price
+        coin = symbol[:3]
+        balance = Balance.from_wallet(self.client.private_wallet_balance())[coin].available_balance
+        logger.info(f'Available balance: account=derivative, coin={coin}, balance={balance :.8f}')
+
         price = self.get_perp_best_price(symbol, 'Sell')
-        qty = self.__calc_qty(symbol[:3], price)  # NOTE: min_trading_qty = US dollar
+        qty = self.__calc_qty(balance, price)  # NOTE: min_trading_qty = US dollar
         min_qty = self.perp_symbols[symbol]['lot_size_filter']['min_trading_qty']
         if qty < min_qty:
             logger.info(f"Can't create an order because qty({qty}) is less than min_trading_qty({min_qty}).")
             return
 
-        order_id = self.create_invperp_order(symbol, 'Sell', qty, price)
-        logger.info('Sleep for 20 seconds.')
-        time.sleep(20)
-
-        while self.alive:
-
-            # get active orders
-            logger.info(f'Get active order: order_id={order_id}')
-            order = self.client.private_order(symbol=symbol, order_id=order_id)
-            logger.info(f'Active Order:\n{json.dumps(order, indent=True)}')
-
-            if order['order_status'] == 'Filled' and order['leaves_qty'] == 0:
-                logger.info(f'Order was filled. order_id={order_id}')
-                send_message(f"Created short position for {order['qty']} {order['symbol']}.")
-                break
-
-            elif order['order_status'] == 'Cancelled':
-                logger.info(f"Order was cancelled. order_id={order_id}, reason={order['reject_reason']}")
-                price = self.get_perp_best_price(symbol, order['side'])
-                qty = self.__calc_qty(symbol[:3], price)
-                order_id = self.create_invperp_order(symbol, order['side'], qty, price)
-
-            else:
-                logger.info(f'Order is not filled yet. order_id={order_id}')
-
-                price = self.get_perp_best_price(symbol, order['side'])
-                if order['price'] != price:
-                    logger.info(f'Update order price. order_id={order_id}')
-
-                    # cancel & create order
-                    logger.info(f'Cancel sell order to change price. order_id={order_id}')
-                    res = self.client.private_order_cancel(symbol=symbol, order_id=order_id)
-                    time.sleep(2)
-
-                    qty = self.__calc_qty(symbol[:3], price)
-                    min_qty = self.perp_symbols[symbol]['lot_size_filter']['min_trading_qty']
-                    if qty < min_qty:
-                        logger.info(f"Can't create an order because qty({qty}) is less than min_trading_qty({min_qty}).")
-                        return
+        def resize(price, filled_qty, filled_value):
+            return filled_qty + self.__calc_qty(balance - filled_value, price)
 
-                    order_id = self.create_invperp_order(symbol, order['side'], qty, price)
+        filled = self.chaser.chase(symbol, 'Sell', qty, min_qty, resize)
+        if filled:
+            self.notify(f"Created short position for {filled} {symbol}.")
 
-            logger.info('Sleep for 20 seconds.')
-            time.sleep(20)
-
-    def __calc_qty(self, coin: str, price) -> int:
+    def __calc_qty(self, balance: float, price) -> int:
         '''
         Returns
         -------
         int
             quantity of US dollar
         '''
-        balance = self.client.private_wallet_balance()[coin]['available_balance']
-        logger.info(f'Available balance: account=derivative, coin={coin}, balance={balance :.8f}')
         qty = float(price) * balance
         market_order_cost = qty * DERIVATIVE_TAKER_FEE_RATE # market order cost = qty * 0.075%
         return int(qty - market_order_cost)
 
     def close_perp_short(self, symbol: str, usdqty):
         logger.info(f'Close short position of {usdqty} {symbol}.')
-
-        price = self.get_perp_best_price(symbol, 'Buy')
-        order_id = self.create_invperp_order(
-                symbol=symbol, side='Buy', usdqty=usdqty, price=price)
-
-        while self.alive:
-            logger.info('Sleep for 20 seconds.')
-            time.sleep(20)
-
-            # get active orders
-            logger.info(f'Get active order: order_id={order_id}')
-            order = self.client.private_order(symbol=symbol, order_id=order_id)
-            logger.info(f'Active Order:\n{json.dumps(order, indent=True)}')
-
-            if order['order_status'] == 'Filled' and order['leaves_qty'] == 0:
-                logger.info(f'Order was filled. order_id={order_id}')
-                send_message(f"Short position was closed for {order['qty']} {order['symbol']}.")
-                break
-
-            elif order['order_status'] == 'Cancelled':
-                logger.info(f"Order was cancelled. order_id={order_id}, reason={order['reject_reason']}")
-                price = self.get_perp_best_price(symbol, order['side'])
-                order_id = self.create_invperp_order(symbol, order['side'], str(order['qty']), price)
-
-            else:
-                logger.info(f'Order is not filled yet. order_id={order_id}')
-                price = self.get_perp_best_price(symbol, order['side'])
-                if order['price'] != price:
-                    logger.info(f'Update order price. order_id={order_id}')
-
-                    logger.info(f"Replace {order['side']} order: symbol={symbol}, price={price}, qty={usdqty}")
-                    res = self.client.private_order_replace(
-                            symbol=symbol,
-                            order_id=order_id,
-                            p_r_qty=usdqty,
-                            p_r_price=price)
-                    logger.info(f"Order was replaced:\n{json.dumps(res, indent=True)}")
-                    order_id = res['order_id']
-
-                else:
-                    logger.info('No need to update order.')
+        filled = self.chaser.chase(symbol, 'Buy', usdqty)
+        if filled:
+            self.notify(f"Short position was closed for {filled} {symbol}.")
 
     def maintain_position(self, symbol: str) -> None:
         logger.info(f"Start to maintain position.")
 
         # get previous fr
-        prev_fr = self.client.public_funding_prevfundingrate(symbol=symbol)
+        prev_fr = self.market.prev_funding_rate(symbol)
+        if self.store:
+            self.store.add_funding_rate(prev_fr)
         fr = float(prev_fr['funding_rate'])
         fr_t = datetime.fromtimestamp(prev_fr['funding_rate_timestamp']).astimezone(timezone.utc)
         logger.info(f"Previous {prev_fr['symbol']} FR: {fr:.6%} ({fr_t.isoformat()})")
 
+        # the previous rate was fixed an interval ago, the premium since tells the next one
+        predicted = self.market.predicted_funding_rate(symbol)
+        if predicted is not None:
+            logger.info(f"Predicted {symbol} FR: {predicted:.6%}")
+            if self.use_predicted_fr:
+                fr = predicted
+
         # get current position
-        pos = self.client.private_position_list(symbol)
+        pos = Position.from_dict(self.client.private_position_list(symbol))
         logger.info(f"Current {symbol} position size: {pos['size']}")
 
         # close position since fr is less than self.min_exit_fr.
-        if pos['size'] > 0 and fr < self.min_exit_fr:
+        if should_exit(pos['size'], fr, self.min_exit_fr):
             self.close_perp_short(symbol=symbol, usdqty=pos['size'])
 
         # create short position
-        if fr >= self.min_entry_fr:
+        if symbol in self.selected and should_enter(fr, self.min_entry_fr):
             self.create_perp_short(symbol)
 
-        msg = f"{symbol}'s previous FR is {fr:.6%} and will be executed at {fr_t.isoformat()}. Current position size is {pos['size']}."
+        msg = f"{symbol}'s previous FR is {float(prev_fr['funding_rate']):.6%} and will be executed at {fr_t.isoformat()}. Current position size is {pos['size']}."
         logger.info(msg)
 
     def receive_signal(self, signum, stack):
         logger.info(f"Received {signum} signal.")
-        logger.info('Stop bot.')
-        for s in INV_PERP_SYMBOLS:
-            try:
-                self.client.private_order_cancelall(s)
-            except Exception as e:
-                logger.error(f'Failed to cancel order for {s}')
-                logger.exception(e)
+        self.stop()
+        notifier.flush()
         sys.exit(0)
 
+    def stop(self, cancel: bool = None) -> None:
+        '''
+        Parameters
+        ----------
+        cancel: bool
+            cancel all orders. defaults to cancel_on_exit.
+        '''
+        if not self.alive:
+            return
+        logger.info(f'Stop bot. account={self.name}')
+        self.alive = False
+        self.scheduler.stop()
+        # wake the chases, which stop before creating or amending another order
+        for e in self.updates.values():
+            e.set()
+        self.orders.stop()
+        if not self.chaser.wait(STOP_TIMEOUT):
+            logger.warning(f'Chases did not stop in {STOP_TIMEOUT} seconds.')
+        if not (self.cancel_on_exit if cancel is None else cancel):
+            logger.info('Keep the open orders to resume chasing them after restart.')
+            return
+        chases = self.journal.chases() if self.journal else {}
+        calls = [(self.client.private_order_cancelall, {'symbol': s}) for s in self.symbols]
+        for s, res in zip(self.symbols, self.client.batch(calls)):
+            if isinstance(res, Exception):
+                logger.error(f'Failed to cancel order for {s}')
+                logger.error(error_message(res, traceback=True))
+            elif s in chases:
+                # the order is gone, so the next start must not resume the chase
+                self.journal.chase_done(s)
+
     def send_pos_maintenance_result(self) -> None:
+        with priority(PRIORITY_LOW):
+            self.__send_pos_maintenance_result()
+        logger.info(f'Rate limit stats: {self.client.rate_limiter.stats()}')
+
+    def __send_pos_maintenance_result(self) -> None:
 
         # get previous fr
-        frs = [self.client.public_funding_prevfundingrate(symbol=s) for s in INV_PERP_SYMBOLS]
+        frs = [self.market.prev_funding_rate(s) for s in self.symbols]
         fr_time = datetime.fromtimestamp(
                 frs[0]['funding_rate_timestamp']).astimezone(timezone.utc)
         fr_s = ', '.join([f"{f['symbol']}={float(f['funding_rate']):.6%}" for f in frs])
 
         # position
-        pos = self.client.private_position_list()
-        p_s = [f"{p['data']['symbol']}={p['data']['size']}" for p in pos if p['data']['size'] > 0]
+        pos = [Position.from_dict(p['data']) for p in self.client.private_position_list()]
+        p_s = [f"{p.symbol}={p.size}" for p in pos if p.size > 0]
 
         # balance
-        balance = self.client.private_wallet_balance()
+        balance = Balance.from_wallet(self.client.private_wallet_balance())
         s = '%s: balance=%.6f, unrealised_pnl=%.6f'
-        b_s = [s % (k, v['wallet_balance'], v['unrealised_pnl']) for k, v in balance.items() if v['wallet_balance']]
+        b_s = [s % (k, v.wallet_balance, v.unrealised_pnl) for k, v in balance.items() if v.wallet_balance]
+
+        if self.store:
+            for f in frs:
+                self.store.add_funding_rate(f)
+            self.store.add_balances(balance)
 
         now = datetime.now(timezone.utc)
         msg = f"""bybit-fr-bot maintained result ({now.strftime('%Y-%m-%d %H:%M:%S')} UTC).
@@ -228,56 +338,213 @@ class FundingRateBot():
 {', '.join(p_s)}
 ```
 """
-        send_message(msg)
+        self.notify(msg)
+
+    def funding_interval(self, symbol: str) -> int:
+        return self.perp_symbols.get(symbol, {}).get('funding_interval', DEFAULT_FUNDING_INTERVAL)
+
+    def group_by_funding_time(self, symbols: list, after: float) -> dict:
+        groups = {}
+        for s in symbols:
+            groups.setdefault(next_funding_time(after, self.funding_interval(s)), []).append(s)
+        return groups
+
+    def schedule_funding(self, funding_time: float, symbols: list) -> None:
+        maintain_at = funding_time - MAINTENANCE_LEAD
+        self.scheduler.at(maintain_at - self.prewarm_lead, self.prewarm, symbols)
+        self.scheduler.at(maintain_at, self.maintain_window, symbols, funding_time)
+        self.scheduler.at(funding_time + ENTRY_DELAY, self.after_funding, symbols, funding_time)
+
+    def after_funding(self, symbols: list, funding_time: float) -> None:
+        for t, ss in self.group_by_funding_time(symbols, funding_time).items():
+            self.schedule_funding(t, ss)
+        self.run_window(self.create_perp_short, self.select_symbols(symbols), funding_time)
+        if self.store:
+            with priority(PRIORITY_LOW):
+                self.record_fundings(symbols)
+
+    def record_fundings(self, symbols: list) -> None:
+        '''
+        Store the funding fees paid or received at the last funding time.
+        '''
+        for s in symbols:
+            try:
+                self.store.add_funding(self.client.private_funding_prevfunding(s))
+            except Exception as e:
+                logger.warning(f'Failed to get funding fee of {s}: {error_message(e)}')
 
-    def run(self):
-        signal.signal(signal.SIGTERM, self.receive_signal)
-        signal.signal(signal.SIGINT, self.receive_signal)
+    def maintain_window(self, symbols: list, funding_time: float) -> None:
+        self.select_symbols(symbols)
+        self.run_window(self.maintain_position, symbols, funding_time)
 
-        env = 'TESTNET' if self.test else 'MAINNET'
-        m = f'Run bybit-frbot in {env}.'
-        logger.info(m)
-        send_message(m)
+    def select_symbols(self, symbols: list) -> list:
+        '''
+        Pick the symbols to create positions for in this window.
+        Positions of the other symbols are still maintained and closed.
 
-        BEFORE_FR_HOURS = [7, 15, 23]
-        FR_HOURS = [0, 8, 16]
-        last_maintened_time = None
-        last_created_at = None
+        Returns
+        -------
+        list
+            the picked symbols among the given ones
+        '''
+        if self.scanner:
+            try:
+                self.selected = set(self.scanner.select(self.symbols))
+            except Exception as e:
+                logger.error('Failed to scan symbols. Keep the previous selection.')
+                logger.error(error_message(e, traceback=True))
+        return [s for s in symbols if s in self.selected]
 
-        while self.alive:
+    def prewarm(self, symbols: list) -> None:
+        '''
+        Open pooled connections and fill the caches used by maintain_position
+        before the window starts.
+        '''
+        jobs = [(self.market.prev_funding_rate, s) for s in symbols]
+        jobs.append((self.client.private_wallet_balance,))
+        threads = [Thread(target=j[0], args=j[1:]) for j in jobs]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def run_window(self, job, symbols: list, funding_time: float = None) -> None:
+        '''
+        Run the job for each symbol concurrently.
 
-            threads = []
-            target = None
-            args = None
-            now = datetime.now(tz=timezone.utc)
+        Parameters
+        ----------
+        funding_time: float
+            funding time of the window. symbols for which the journal tells the
+            job already completed in this window are skipped.
+        '''
+        if self.journal and funding_time:
+            done = [s for s in symbols if (self.journal.window_time(job.__name__, s) or 0) >= funding_time]
+            if done:
+                logger.info(f'Skip {job.__name__} of {done}, which already completed in this window.')
+            symbols = [s for s in symbols if s not in done]
+        start = time.perf_counter()
+        threads = [Thread(target=self.__run_job, args=(job, s, funding_time), name=f'{job.__name__}-{s}')
+                   for s in symbols]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        WINDOW_SECONDS.observe(time.perf_counter() - start, job.__name__)
+        self.send_pos_maintenance_result()
+        logger.info(f"Sleeping...")
+
+    def __run_job(self, job, symbol: str, funding_time: float) -> None:
+        resumed = self.resumed.get(symbol)
+        if resumed:
+            # the job decides from the position the resumed chase leaves
+            resumed.join()
+        try:
+            job(symbol)
+        except Exception as e:
+            # an error left after the retries ends the job of this symbol only,
+            # and the window is not marked done so that a restart runs it again.
+            # the message of a failed request holds its signed url, which is redacted
+            logger.error(error_message(e, traceback=True))
+            self.notify(f"{job.__name__} of {symbol} failed.\n```{error_message(e)}```")
+            return
+        if self.journal and funding_time:
+            self.journal.window_done(job.__name__, symbol, funding_time)
 
-            if now.hour in BEFORE_FR_HOURS and now.minute >= 55 \
-                    and (not last_maintened_time or now.hour != last_maintened_time.hour):
-                threads = [Thread(target=self.maintain_position, args=(s,)) for s in INV_PERP_SYMBOLS]
-                last_maintened_time = now
+    def recover(self) -> None:
+        '''
+        Reconcile the journal with the exchange: resume the chases left
+        unfinished by the last run, and cancel open orders no chase owns.
+        Chases started before the current funding interval are dropped, as
+        the window they were made for is over.
+        '''
+        now = time.time()
+        chases = {}
+        for s, c in (self.journal.chases() if self.journal else {}).items():
+            if s not in self.symbols:
+                continue
+            interval_start = next_funding_time(now, self.funding_interval(s)) - self.funding_interval(s) * 60
+            if c.get('ts', 0) < interval_start:
+                logger.info(f'Drop a chase of the previous funding interval: symbol={s}, state={c}')
+                self.journal.chase_done(s)
+                continue
+            chases[s] = c
+        owned = {c['order_id'] for c in chases.values()}
+        for symbol in self.symbols:
+            for o in self.client.private_order(symbol) or []:
+                if o['order_id'] in owned:
+                    continue
+                logger.info(f"Cancel an order not owned by any chase. symbol={symbol}, order_id={o['order_id']}")
+                try:
+                    self.orders.cancel(symbol=symbol, order_id=o['order_id']).result(ORDER_TIMEOUT)
+                except (BybitAPIError, TimeoutError) as e:
+                    logger.warning(f"Failed to cancel order. order_id={o['order_id']}, error={e}")
+
+        pos = {p['data']['symbol']: p['data']['size'] for p in self.client.private_position_list()}
+        logger.info(f'Positions at startup: {pos}')
+        for symbol, c in chases.items():
+            logger.info(f'Resume chasing: symbol={symbol}, state={c}')
+            t = Thread(target=self.resume_chase, args=(symbol, c), name=f'resume_chase-{symbol}')
+            self.resumed[symbol] = t
+            t.start()
+
+    def resume_chase(self, symbol: str, state: dict) -> None:
+        order_id = state['order_id']
+        try:
+            self.get_order(symbol, order_id)
+        except BybitAPIError as e:
+            logger.info(f'Order of the chase was not found, create a new one. order_id={order_id}, error={e}')
+            order_id = None
+        filled = self.chaser.chase(symbol, state['side'], state['qty'], state['min_qty'],
+                                   order_id=order_id, done=(state['done_qty'], state['done_value']))
+        if filled:
+            self.notify(f"Resumed {state['side'].lower()} of {symbol} was filled for {filled}.")
 
-            elif now.hour in FR_HOURS and 0 < now.minute < 10 \
-                    and (not last_created_at or now.hour != last_created_at.hour):
-                threads = [Thread(target=self.create_perp_short, args=(s,)) for s in INV_PERP_SYMBOLS]
-                last_created_at = now
+    def run(self):
+        signal.signal(signal.SIGTERM, self.receive_signal)
+        signal.signal(signal.SIGINT, self.receive_signal)
 
-            if threads:
-                for t in threads:
-                    t.start()
-                for t in threads:
-                    t.join()
-                self.send_pos_maintenance_result()
-                logger.info(f"Sleeping...")
+        env = 'TESTNET' if self.test else 'MAINNET'
+        m = f'Run bybit-frbot in {env}.'
+        logger.info(m)
+        self.notify(m)
 
-            time.sleep(5)
+        self.start()
+        self.scheduler.run()
 
+    def start(self) -> None:
+        '''
+        Start the streams and schedule the funding windows.
+        The scheduler has to be run by the caller.
+        '''
+        self.market.start()
+        self.private.start()
+        self.recover()
+
+        now = time.time()
+        for funding_time, symbols in self.group_by_funding_time(self.symbols, now).items():
+            prev_funding_time = funding_time - self.funding_interval(symbols[0]) * 60
+            if now < prev_funding_time + ENTRY_WINDOW:
+                # started right after a funding time, so create positions first
+                self.scheduler.at(max(now, prev_funding_time + ENTRY_DELAY),
+                                  self.after_funding, symbols, prev_funding_time)
+            else:
+                self.schedule_funding(funding_time, symbols)
 
 if __name__ == '__main__':
     try:
+        if METRICS_PORT:
+            start_http_server(METRICS_PORT)
+        max_symbols = int(os.environ.get('MAX_SYMBOLS', 0))
         bot = FundingRateBot(api_key=os.environ['BYBIT_APIKEY'],
                              api_secret=os.environ['BYBIT_SECRET'],
-                             test=os.environ['BYBIT_TEST'].lower() == 'true')
+                             test=os.environ['BYBIT_TEST'].lower() == 'true',
+                             symbols=None if max_symbols else INV_PERP_SYMBOLS,
+                             max_symbols=max_symbols or None,
+                             store=Store(os.path.join(STORE_DIR, 'frbot.db')),
+                             journal=Journal(os.path.join(STORE_DIR, 'journal.jsonl')))
         bot.run()
     except Exception as e:
-        logger.exception(e)
-        send_message(f"An error has occurred.\n```{e}```")
+        logger.error(error_message(e, traceback=True))
+        send_message(f"An error has occurred.\n```{error_message(e)}```")
+        notifier.flush()
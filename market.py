@@ -0,0 +1,128 @@
+from logging import getLogger
+from typing import Callable
+
+from api import InversePerp
+from cache import PREV_FUNDING_RATE_PATH, TTLCache, until_next_funding
+from estimator import FundingRateEstimator
+from ratelimit import RateLimiter
+from scheduler import DEFAULT_FUNDING_INTERVAL
+from stream import InstrumentStream, OrderBookStream
+from transport import CircuitBreaker, RetryPolicy
+
+
+logger = getLogger(__name__)
+
+
+HEDGE_AFTER = 0.25
+'''seconds after which a slow order book or tickers read is duplicated'''
+
+
+def is_inverse_perp(s: dict) -> bool:
+    return s['quote_currency'] == 'USD' and s['name'].endswith('USD')
+
+
+class MarketData(object):
+    '''
+    Public market data shared by the bots of every account in a process.
+
+    Order books are kept by one websocket feed, and funding rates and
+    symbols are fetched by one unauthenticated client whose cache and rate
+    limiter are shared, so adding an account adds no public traffic.
+    Mark and index prices of the instrument feed, and the tickers fetched through
+    `tickers`, keep the estimate of the next funding rates up to date.
+
+    Parameters
+    ----------
+    symbols: list
+        symbols of all the accounts. all inverse perpetuals listed on Bybit if None.
+    base_url: str
+        base url of the api overriding mainnet/testnet
+    latency_hook: Callable[[str, str, float], None]
+        passed to the client of the public api
+    persistent_cache: bool
+        save the symbols on disk to warm up the next start. disable for a mock exchange.
+    '''
+
+    def __init__(self,
+                 symbols: list,
+                 test: bool = True,
+                 base_url: str = None,
+                 latency_hook: Callable[[str, str, float], None] = None,
+                 persistent_cache: bool = True):
+        self.client = InversePerp('', '', test,
+                                  base_url=base_url,
+                                  pool_size=max(10, len(symbols or ())),
+                                  latency_hook=latency_hook,
+                                  rate_limiter=RateLimiter(),
+                                  cache=TTLCache() if persistent_cache else TTLCache(persistent=set()),
+                                  retry=RetryPolicy(),
+                                  breaker=CircuitBreaker(),
+                                  hedge_after=HEDGE_AFTER)
+        self.perp_symbols = {s['name']: s for s in self.client.public_symbols()}
+        if symbols is None:
+            symbols = [n for n, s in self.perp_symbols.items() if is_inverse_perp(s)]
+        self.symbols = symbols
+        self.books = OrderBookStream(symbols, test)
+        self.instruments = InstrumentStream(symbols, test)
+        self.instruments.add_listener(self.__on_instrument)
+        intervals = {s: self.perp_symbols.get(s, {}).get('funding_interval', DEFAULT_FUNDING_INTERVAL) for s in symbols}
+        self.client.cache.set_ttl(PREV_FUNDING_RATE_PATH, until_next_funding(intervals))
+        self.estimator = FundingRateEstimator(symbols, intervals)
+
+    def start(self) -> None:
+        '''
+        Start the feeds. Called by each bot, only the first call starts them.
+        '''
+        self.books.start()
+        self.instruments.start()
+
+    def stop(self) -> None:
+        self.books.stop()
+        self.instruments.stop()
+
+    def __on_instrument(self, symbol: str) -> None:
+        mark, index = self.instruments.prices[symbol]
+        self.estimator.update(symbol, mark, index)
+
+    def add_listener(self, listener: Callable[[str], None]) -> None:
+        '''
+        Register a callback called with a symbol whenever its best price changes.
+        '''
+        self.books.add_listener(listener)
+
+    def best_price(self, symbol: str, side: str) -> str:
+        best = self.books.best(symbol, side)
+        if best:
+            logger.debug('Best %s of %s: price=%s, size=%s', side, symbol, best[0], best[1])
+            return best[0]
+
+        # fall back to rest api while the stream is not synced
+        res = self.client.public_orderbook_l2(symbol)
+        best = next(r for r in res if r['side'] == side)
+        name = 'Bid' if side == 'Buy' else 'Ask'
+        logger.info(f"Best {name} of {best['symbol']}: price={best['price']}, size={best['size']}")
+        return best['price']
+
+    def prev_funding_rate(self, symbol: str) -> dict:
+        return self.client.public_funding_prevfundingrate(symbol=symbol)
+
+    def predicted_funding_rate(self, symbol: str) -> float:
+        '''
+        Returns
+        -------
+        float
+            funding rate estimated from the premium of the current interval,
+            or None until enough of the interval is sampled
+        '''
+        return self.estimator.predicted_rate(symbol)
+
+    def tickers(self) -> list:
+        '''
+        Returns
+        -------
+        list
+            tickers of all symbols, which are also sampled by the estimator
+        '''
+        tickers = self.client.public_tickers()
+        self.estimator.update_tickers(tickers)
+        return tickers
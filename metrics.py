@@ -0,0 +1,137 @@
+'''
+Minimal Prometheus style metrics.
+
+Metrics are defined at module level by the modules that update them and
+registered to REGISTRY, which `start_http_server` exposes in the Prometheus
+text format. Updating a metric costs one lock and a dict lookup.
+'''
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+from threading import Lock, Thread
+
+
+logger = getLogger(__name__)
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+'''upper bounds (seconds) of histogram buckets for request latency'''
+
+DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+'''upper bounds (seconds) of histogram buckets for long running jobs'''
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__metrics = []
+
+    def register(self, metric) -> None:
+        with self.__lock:
+            self.__metrics.append(metric)
+
+    def expose(self) -> str:
+        with self.__lock:
+            metrics = list(self.__metrics)
+        return ''.join(m.expose() for m in metrics)
+
+
+REGISTRY = Registry()
+
+
+def _labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter(object):
+
+    def __init__(self, name: str, doc: str, labels: tuple = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.__lock = Lock()
+        self.__values = {}
+        registry.register(self)
+
+    def inc(self, *labels, n: float = 1) -> None:
+        with self.__lock:
+            self.__values[labels] = self.__values.get(labels, 0) + n
+
+    def value(self, *labels) -> float:
+        return self.__values.get(labels, 0)
+
+    def expose(self) -> str:
+        with self.__lock:
+            values = dict(self.__values)
+        lines = [f'# HELP {self.name} {self.doc}\n', f'# TYPE {self.name} counter\n']
+        lines += [f'{self.name}{_labels(self.labels, k)} {v}\n' for k, v in values.items()]
+        return ''.join(lines)
+
+
+class Histogram(object):
+
+    def __init__(self, name: str, doc: str, labels: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS, registry: Registry = REGISTRY):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = buckets
+        self.__lock = Lock()
+        self.__values = {}
+        registry.register(self)
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self.__lock:
+            v = self.__values.get(labels)
+            if v is None:
+                # counts of each bucket (and +Inf), sum
+                v = self.__values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            v[0][i] += 1
+            v[1] += value
+
+    def expose(self) -> str:
+        with self.__lock:
+            values = {k: (list(v[0]), v[1]) for k, v in self.__values.items()}
+        lines = [f'# HELP {self.name} {self.doc}\n', f'# TYPE {self.name} histogram\n']
+        for k, (counts, total) in values.items():
+            cumulative = 0
+            for le, c in zip(self.buckets + ('+Inf',), counts):
+                cumulative += c
+                le = 'le="%s"' % le
+                lines.append(f'{self.name}_bucket{_labels(self.labels, k, le)} {cumulative}\n')
+            lines.append(f'{self.name}_sum{_labels(self.labels, k)} {total}\n')
+            lines.append(f'{self.name}_count{_labels(self.labels, k)} {cumulative}\n')
+        return ''.join(lines)
+
+
+def start_http_server(port: int, host: str = '127.0.0.1', registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    '''
+    Serve the metrics at http://host:port/metrics from a daemon thread.
+    '''
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            data = registry.expose().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+    logger.info(f'Serve metrics at http://{host}:{server.server_address[1]}/metrics')
+    return server
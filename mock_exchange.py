@@ -0,0 +1,374 @@
+'''
+Local stand-in of the Bybit v2 inverse perpetual REST API.
+
+Implements the endpoints used by InversePerp with a simple matching engine,
+so the bot can be driven for load and latency benchmarks without testnet.
+Signatures are not verified.
+'''
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+from threading import Lock, Thread
+from urllib.parse import parse_qsl, urlparse
+import itertools
+import json
+import random
+import time
+
+from ratelimit import ENDPOINT_GROUPS, RATE_LIMITS
+
+
+logger = getLogger(__name__)
+
+
+TICK_SIZE = 0.5
+DEPTH = 25
+
+
+class MockExchange(object):
+    '''
+    Parameters
+    ----------
+    symbols: list
+        symbols to list. the first three letters are the coin.
+    latency: float
+        mean seconds added before each response
+    jitter: float
+        standard deviation of the added latency
+    error_rate: float
+        ratio of requests failing with a http 503 or a non-zero ret_code
+    lost_rate: float
+        ratio of requests executed but answered with a http 504, as if the response was lost
+    rate_limits: dict
+        (requests, seconds) of each endpoint group. no limit if None.
+    fill_prob: float
+        probability that a taker trade hits the best level of each symbol per step
+    step: float
+        seconds between steps of the market
+    '''
+
+    def __init__(self,
+                 symbols: list,
+                 port: int = 0,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 lost_rate: float = 0.0,
+                 rate_limits: dict = RATE_LIMITS,
+                 fill_prob: float = 0.1,
+                 step: float = 0.05,
+                 balance: float = 1.0,
+                 seed: int = None):
+        self.symbols = symbols
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.lost_rate = lost_rate
+        self.rate_limits = rate_limits
+        self.fill_prob = fill_prob
+        self.step = step
+        self.random = random.Random(seed)
+        self.lock = Lock()
+        self.ids = itertools.count(1)
+        self.bids = {s: 200 + 100 * i for i, s in enumerate(symbols)}  # best bid in ticks
+        self.orders = {}
+        self.positions = {s: 0 for s in symbols}
+        self.balances = {s[:3]: balance for s in symbols}
+        self.windows = {}
+        self.requests = {}
+        self.alive = False
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self.__handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self) -> None:
+        self.alive = True
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        Thread(target=self.__run_market, daemon=True).start()
+
+    def stop(self) -> None:
+        self.alive = False
+        self.server.shutdown()
+        self.server.server_close()
+
+    #
+    # market
+    #
+
+    def __run_market(self) -> None:
+        while self.alive:
+            time.sleep(self.step)
+            with self.lock:
+                for s in self.symbols:
+                    self.bids[s] += self.random.choice((-1, 0, 0, 1))
+                    if self.random.random() < self.fill_prob:
+                        side = self.random.choice(('Buy', 'Sell'))
+                        self.__take(s, side, self.random.randint(1, 10000))
+                    self.__match_crossed(s)
+
+    def __best(self, symbol: str, side: str) -> float:
+        ticks = self.bids[symbol] if side == 'Buy' else self.bids[symbol] + 1
+        return ticks * TICK_SIZE
+
+    def __take(self, symbol: str, taker_side: str, size: int) -> None:
+        # a taker buy lifts the best ask, where the resting sells are
+        maker_side = 'Sell' if taker_side == 'Buy' else 'Buy'
+        best = self.__best(symbol, maker_side)
+        for o in self.__resting(symbol, maker_side):
+            if size <= 0:
+                break
+            if (maker_side == 'Sell' and o['price'] <= best) or (maker_side == 'Buy' and o['price'] >= best):
+                size -= self.__fill(o, min(size, o['leaves_qty']))
+
+    def __match_crossed(self, symbol: str) -> None:
+        # the market moved through resting orders
+        for o in self.__resting(symbol):
+            if (o['side'] == 'Sell' and o['price'] <= self.__best(symbol, 'Buy')) \
+                    or (o['side'] == 'Buy' and o['price'] >= self.__best(symbol, 'Sell')):
+                self.__fill(o, o['leaves_qty'])
+
+    def __resting(self, symbol: str, side: str = None) -> list:
+        return [o for o in self.orders.values()
+                if o['symbol'] == symbol and o['order_status'] in ('New', 'PartiallyFilled')
+                and (not side or o['side'] == side)]
+
+    def __fill(self, o: dict, qty: int) -> int:
+        o['leaves_qty'] -= qty
+        o['cum_exec_qty'] += qty
+        o['cum_exec_value'] += qty / o['price']
+        o['order_status'] = 'Filled' if o['leaves_qty'] == 0 else 'PartiallyFilled'
+        o['updated_at'] = time.time()
+        self.positions[o['symbol']] += -qty if o['side'] == 'Sell' else qty
+        return qty
+
+    #
+    # endpoints
+    #
+
+    def orderbook_l2(self, p: dict) -> list:
+        s = p['symbol']
+        bids = [self.__level(s, 'Buy', (self.bids[s] - i) * TICK_SIZE) for i in range(DEPTH)]
+        asks = [self.__level(s, 'Sell', (self.bids[s] + 1 + i) * TICK_SIZE) for i in range(DEPTH)]
+        return bids + asks
+
+    def __level(self, symbol: str, side: str, price: float) -> dict:
+        return {'symbol': symbol, 'price': f'{price:.2f}', 'id': int(price * 10000),
+                'side': side, 'size': self.random.randint(1, 100000)}
+
+    def symbols_(self, p: dict) -> list:
+        return [{'name': s, 'alias': s, 'base_currency': s[:3], 'quote_currency': 'USD',
+                 'price_filter': {'tick_size': str(TICK_SIZE)},
+                 'lot_size_filter': {'min_trading_qty': 1, 'max_trading_qty': 1000000, 'qty_step': 1}}
+                for s in self.symbols]
+
+    def prev_funding_rate(self, p: dict) -> dict:
+        now = int(time.time())
+        return {'symbol': p['symbol'],
+                'funding_rate': f'{self.random.gauss(0.0001, 0.0001):.6f}',
+                'funding_rate_timestamp': now - now % (8 * 60 * 60)}
+
+    def prev_funding(self, p: dict) -> dict:
+        now = int(time.time())
+        size = self.positions[p['symbol']]
+        return {'symbol': p['symbol'], 'side': 'Sell' if size < 0 else 'Buy' if size > 0 else 'None',
+                'size': abs(size), 'funding_rate': '0.0001', 'exec_fee': '0', 'exec_timestamp': now - now % (8 * 60 * 60)}
+
+    def fund_records(self, p: dict) -> dict:
+        return {'data': []}
+
+    def tickers(self, p: dict) -> list:
+        return [{'symbol': s,
+                 'bid_price': f"{self.__best(s, 'Buy'):.2f}",
+                 'ask_price': f"{self.__best(s, 'Sell'):.2f}",
+                 'last_price': f"{self.__best(s, 'Buy'):.2f}",
+                 'funding_rate': f'{self.random.gauss(0.0001, 0.0001):.6f}',
+                 'predicted_funding_rate': f'{self.random.gauss(0.0001, 0.0001):.6f}',
+                 'turnover_24h': f'{self.random.uniform(1e3, 1e5):.4f}'}
+                for s in self.symbols if not p.get('symbol') or p['symbol'] == s]
+
+    def wallet_balance(self, p: dict) -> dict:
+        res = {}
+        for coin, balance in self.balances.items():
+            used = sum(abs(self.positions[s]) / self.__best(s, 'Buy') for s in self.symbols if s[:3] == coin)
+            used += sum(o['leaves_qty'] / o['price'] for o in self.orders.values()
+                        if o['symbol'][:3] == coin and o['order_status'] in ('New', 'PartiallyFilled'))
+            res[coin] = {'equity': balance, 'wallet_balance': balance, 'unrealised_pnl': 0.0,
+                         'available_balance': max(balance - used, 0.0)}
+        return res
+
+    def position_list(self, p: dict):
+        def position(s):
+            size = self.positions[s]
+            return {'symbol': s, 'side': 'Sell' if size < 0 else 'Buy' if size > 0 else 'None',
+                    'size': abs(size)}
+        if p.get('symbol'):
+            return position(p['symbol'])
+        return [{'data': position(s), 'is_valid': True} for s in self.symbols]
+
+    def order(self, p: dict):
+        if p.get('order_link_id'):
+            o = next((o for o in self.orders.values() if o['order_link_id'] == p['order_link_id']), None)
+        elif not p.get('order_id'):
+            return [dict(o) for o in self.__resting(p['symbol'])]
+        else:
+            o = self.orders.get(p.get('order_id'))
+        if not o:
+            raise MockAPIError(20001, 'order not exists')
+        return dict(o)
+
+    def order_create(self, p: dict) -> dict:
+        s, side, price = p['symbol'], p['side'], float(p['price'])
+        o = {'order_id': str(next(self.ids)), 'order_link_id': p.get('order_link_id', ''),
+             'symbol': s, 'side': side, 'order_type': p['order_type'], 'price': price,
+             'qty': int(p['qty']), 'leaves_qty': int(p['qty']), 'cum_exec_qty': 0, 'cum_exec_value': 0.0,
+             'time_in_force': p.get('time_in_force', 'GoodTillCancel'),
+             'order_status': 'New', 'reject_reason': '', 'created_at': time.time(), 'updated_at': time.time()}
+        self.orders[o['order_id']] = o
+        if self.__crosses(o):
+            if o['time_in_force'] == 'PostOnly':
+                o['order_status'] = 'Cancelled'
+                o['reject_reason'] = 'EC_PostOnlyWillTakeLiquidity'
+            else:
+                self.__fill(o, o['leaves_qty'])
+        return dict(o)
+
+    def order_cancel(self, p: dict) -> dict:
+        o = self.orders.get(p.get('order_id'))
+        if not o or o['order_status'] not in ('New', 'PartiallyFilled'):
+            raise MockAPIError(20001, 'order not exists or too late to cancel')
+        o['order_status'] = 'Cancelled'
+        o['reject_reason'] = 'EC_PerCancelRequest'
+        return dict(o)
+
+    def order_replace(self, p: dict) -> dict:
+        o = self.orders.get(p.get('order_id'))
+        if not o or o['order_status'] not in ('New', 'PartiallyFilled'):
+            raise MockAPIError(20001, 'order not exists or too late to replace')
+        if p.get('p_r_price'):
+            o['price'] = float(p['p_r_price'])
+        if p.get('p_r_qty'):
+            o['leaves_qty'] = max(int(p['p_r_qty']) - o['cum_exec_qty'], 0)
+            o['qty'] = int(p['p_r_qty'])
+        if self.__crosses(o) and o['time_in_force'] == 'PostOnly':
+            o['order_status'] = 'Cancelled'
+            o['reject_reason'] = 'EC_PostOnlyWillTakeLiquidity'
+        return {'order_id': o['order_id']}
+
+    def order_cancelall(self, p: dict) -> list:
+        res = []
+        for o in self.__resting(p['symbol']):
+            o['order_status'] = 'Cancelled'
+            res.append(dict(o))
+        return res
+
+    def __crosses(self, o: dict) -> bool:
+        if o['side'] == 'Sell':
+            return o['price'] <= self.__best(o['symbol'], 'Buy')
+        return o['price'] >= self.__best(o['symbol'], 'Sell')
+
+    ROUTES = {
+        ('GET', '/v2/public/orderBook/L2'): orderbook_l2,
+        ('GET', '/v2/public/symbols'): symbols_,
+        ('GET', '/v2/public/funding/prev-funding-rate'): prev_funding_rate,
+        ('GET', '/v2/public/tickers'): tickers,
+        ('GET', '/v2/private/wallet/balance'): wallet_balance,
+        ('GET', '/v2/private/wallet/fund/records'): fund_records,
+        ('GET', '/v2/private/funding/prev-funding'): prev_funding,
+        ('GET', '/v2/private/position/list'): position_list,
+        ('GET', '/v2/private/order'): order,
+        ('POST', '/v2/private/order/create'): order_create,
+        ('POST', '/v2/private/order/cancel'): order_cancel,
+        ('POST', '/v2/private/order/replace'): order_replace,
+        ('POST', '/v2/private/order/cancelAll'): order_cancelall,
+    }
+
+    #
+    # server
+    #
+
+    def handle(self, method: str, path: str, params: dict) -> tuple:
+        '''
+        Returns
+        -------
+        tuple
+            (http status, response body)
+        '''
+        if self.latency or self.jitter:
+            time.sleep(max(self.random.gauss(self.latency, self.jitter), 0))
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            route = self.ROUTES.get((method, path))
+            if not route:
+                return 404, {'ret_code': 10000, 'ret_msg': 'not found'}
+            body = {'ret_code': 0, 'ret_msg': 'OK', 'ext_code': '', 'time_now': f'{time.time():.6f}'}
+            body.update(self.__rate_limit(path))
+            if body.get('rate_limit_status', 1) < 0:
+                body.update({'ret_code': 10006, 'ret_msg': 'too many visits', 'result': None})
+                return 200, body
+            if self.random.random() < self.error_rate:
+                if self.random.random() < 0.5:
+                    return 503, {'ret_code': 10016, 'ret_msg': 'service unavailable'}
+                body.update({'ret_code': 10016, 'ret_msg': 'server error', 'result': None})
+                return 200, body
+            try:
+                body['result'] = route(self, params)
+            except MockAPIError as e:
+                body.update({'ret_code': e.code, 'ret_msg': e.msg, 'result': None})
+            if self.random.random() < self.lost_rate:
+                return 504, {'ret_code': 10016, 'ret_msg': 'gateway timeout'}
+            return 200, body
+
+    def __rate_limit(self, path: str) -> dict:
+        if not self.rate_limits:
+            return {}
+        group = ENDPOINT_GROUPS.get(path, 'public')
+        limit, period = self.rate_limits[group]
+        now = time.time()
+        start, count = self.windows.get(group, (now, 0))
+        if now - start >= period:
+            start, count = now, 0
+        count += 1
+        self.windows[group] = (start, count)
+        return {'rate_limit': limit,
+                'rate_limit_status': limit - count,
+                'rate_limit_reset_ms': int((start + period) * 1000)}
+
+    def __handler(self):
+        exchange = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                self.__respond(*exchange.handle('GET', url.path, dict(parse_qsl(url.query))))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                params = json.loads(self.rfile.read(length) or b'{}')
+                self.__respond(*exchange.handle('POST', urlparse(self.path).path, params))
+
+            def __respond(self, status: int, body: dict):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class MockAPIError(Exception):
+
+    def __init__(self, code: int, msg: str):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
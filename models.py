@@ -0,0 +1,133 @@
+'''
+Compact models of api and stream responses.
+
+Numeric fields are parsed once when a model is built, and each model
+keeps its fields in __slots__ instead of a dict. Orders, positions and
+balances are snapshots which are replaced, not modified, when a newer
+state arrives. Levels of an order book are updated in place.
+
+For code written against raw responses, fields can also be read like
+dict items, e.g. order['price'] or order.get('reject_reason').
+'''
+
+
+def _int(v) -> int:
+    return int(float(v)) if isinstance(v, str) else int(v)
+
+
+_PARSERS = {str: None, float: float, int: _int}
+
+
+class Model(object):
+
+    __slots__ = ()
+    FIELDS = {}
+    '''name -> type of each field. None or empty fields are kept as None.'''
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._parsers = tuple((k, _PARSERS[t]) for k, t in cls.FIELDS.items())
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        m = cls.__new__(cls)
+        get = d.get
+        for k, parse in cls._parsers:
+            v = get(k)
+            setattr(m, k, v if parse is None or v is None or v == '' else parse(v))
+        return m
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.to_dict()})'
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+
+class Order(Model):
+
+    FIELDS = {
+        'order_id': str,
+        'order_link_id': str,
+        'symbol': str,
+        'side': str,
+        'order_type': str,
+        'time_in_force': str,
+        'price': float,
+        'qty': int,
+        'leaves_qty': int,
+        'cum_exec_qty': int,
+        'cum_exec_value': float,
+        'cum_exec_fee': float,
+        'order_status': str,
+        'reject_reason': str,
+    }
+    __slots__ = tuple(FIELDS)
+
+
+class Position(Model):
+
+    FIELDS = {
+        'symbol': str,
+        'side': str,
+        'size': int,
+        'entry_price': float,
+        'position_value': float,
+        'leverage': float,
+        'liq_price': float,
+        'unrealised_pnl': float,
+    }
+    __slots__ = tuple(FIELDS)
+
+
+class Balance(Model):
+
+    FIELDS = {
+        'equity': float,
+        'wallet_balance': float,
+        'available_balance': float,
+        'unrealised_pnl': float,
+    }
+    __slots__ = tuple(FIELDS)
+
+    @classmethod
+    def from_wallet(cls, result: dict) -> dict:
+        '''
+        Parameters
+        ----------
+        result: dict
+            result of private_wallet_balance
+
+        Returns
+        -------
+        dict
+            Balance by coin
+        '''
+        return {coin: cls.from_dict(v) for coin, v in result.items()}
+
+
+class Level(object):
+    '''
+    Price level of an order book. The price is parsed once for sorting,
+    and kept as given for orders, which must not lose its precision.
+    '''
+
+    __slots__ = ('price', 'price_str', 'side', 'size')
+
+    def __init__(self, price_str: str, side: str, size: int):
+        self.price = float(price_str)
+        self.price_str = price_str
+        self.side = side
+        self.size = size
@@ -0,0 +1,134 @@
+'''
+Run the bots of many accounts in one process, or sharded across worker
+processes, sharing the public market data between the accounts of a process.
+
+The accounts are read from the json file at $ACCOUNTS_FILE, e.g.
+
+    [
+      {"name": "sub1", "api_key_env": "SUB1_APIKEY", "api_secret_env": "SUB1_SECRET"},
+      {"name": "sub2", "api_key_env": "SUB2_APIKEY", "api_secret_env": "SUB2_SECRET",
+       "symbols": ["BTCUSD", "ETHUSD", "XRPUSD", "EOSUSD", "DOTUSD"], "max_symbols": 2}
+    ]
+
+Keys are read from the environment variables named by the file, so the
+file itself holds no secrets. "max_symbols" enables UniverseScanner for
+the account. $WORKERS sets the number of worker processes.
+'''
+from threading import Thread
+import json
+import multiprocessing
+import os
+import signal
+import sys
+
+from constants import INV_PERP_SYMBOLS
+from journal import Journal
+from log import error_message
+from main import METRICS_PORT, STORE_DIR, FundingRateBot, logger, notifier, send_message
+from market import MarketData
+from metrics import start_http_server
+from store import Store
+
+
+def load_accounts(path: str) -> list:
+    with open(path) as f:
+        accounts = json.load(f)
+    return [{
+        'name': a['name'],
+        'api_key': os.environ[a['api_key_env']],
+        'api_secret': os.environ[a['api_secret_env']],
+        'symbols': a.get('symbols', INV_PERP_SYMBOLS),
+        'max_symbols': a.get('max_symbols'),
+    } for a in accounts]
+
+
+def shard(accounts: list, n: int) -> list:
+    '''
+    Returns
+    -------
+    list
+        n lists of accounts dealt in turn
+    '''
+    return [s for s in (accounts[i::n] for i in range(n)) if s]
+
+
+def run_accounts(accounts: list, test: bool, metrics_port: int = 0) -> None:
+    '''
+    Run the bots of the accounts in this process until a signal is received.
+    '''
+    if metrics_port:
+        start_http_server(metrics_port)
+    symbols = sorted({s for a in accounts for s in a['symbols']})
+    market = MarketData(symbols, test)
+    bots = [FundingRateBot(a['api_key'], a['api_secret'], test, symbols=a['symbols'], market=market,
+                           name=a['name'], max_symbols=a['max_symbols'],
+                           store=Store(os.path.join(STORE_DIR, f"{a['name']}.db")),
+                           journal=Journal(os.path.join(STORE_DIR, f"{a['name']}.journal.jsonl")))
+            for a in accounts]
+
+    def receive_signal(signum, stack):
+        logger.info(f"Received {signum} signal.")
+        for b in bots:
+            b.stop()
+        market.stop()
+        notifier.flush()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, receive_signal)
+    signal.signal(signal.SIGINT, receive_signal)
+
+    env = 'TESTNET' if test else 'MAINNET'
+    m = f"Run bybit-frbot in {env} for {', '.join(a['name'] for a in accounts)}."
+    logger.info(m)
+    send_message(m)
+
+    threads = []
+    for b in bots:
+        b.start()
+        threads.append(Thread(target=b.scheduler.run, name=f'Scheduler-{b.name}', daemon=True))
+    for t in threads:
+        t.start()
+    for t in threads:
+        # join with timeout so that signals are handled by the main thread
+        while t.is_alive():
+            t.join(1)
+
+
+def main() -> None:
+    accounts = load_accounts(os.environ.get('ACCOUNTS_FILE', 'accounts.json'))
+    test = os.environ['BYBIT_TEST'].lower() == 'true'
+    workers = int(os.environ.get('WORKERS', 1))
+
+    if workers <= 1:
+        run_accounts(accounts, test, METRICS_PORT)
+        return
+
+    # spawn, so that each worker sets up its own logging and notifier threads.
+    # worker i serves its metrics at METRICS_PORT + i.
+    ctx = multiprocessing.get_context('spawn')
+    processes = [ctx.Process(target=run_accounts, args=(s, test, METRICS_PORT and METRICS_PORT + i),
+                             name=f'worker-{i}')
+                 for i, s in enumerate(shard(accounts, workers))]
+
+    def receive_signal(signum, stack):
+        logger.info(f"Received {signum} signal. Stop workers.")
+        for p in processes:
+            if p.is_alive():
+                p.terminate()
+
+    signal.signal(signal.SIGTERM, receive_signal)
+    signal.signal(signal.SIGINT, receive_signal)
+
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        logger.error(error_message(e, traceback=True))
+        send_message(f"An error has occurred.\n```{error_message(e)}```")
+        notifier.flush()
@@ -0,0 +1,120 @@
+from logging import getLogger
+from queue import Empty, Full, Queue
+from threading import Thread
+import json
+import random
+import time
+
+import requests
+
+
+logger = getLogger(__name__)
+
+
+class SlackNotifier(object):
+    '''
+    Posts messages to a Slack incoming webhook from a background thread.
+
+    `send` only puts the message on a bounded queue, so the caller never
+    waits on Slack. Messages arriving within `coalesce_window` seconds of
+    each other are posted together as one message.
+
+    Parameters
+    ----------
+    url: str
+        webhook url. messages are discarded if empty.
+    maxsize: int
+        max number of queued messages. newer messages are dropped when full.
+    coalesce_window: float
+        seconds to wait for more messages before posting
+    max_batch: int
+        max number of messages posted together
+    max_retries: int
+        times to retry a failed post before dropping its messages
+    backoff: float
+        seconds to wait before the first retry, doubled on each retry
+    '''
+
+    def __init__(self,
+                 url: str,
+                 maxsize: int = 100,
+                 coalesce_window: float = 1.0,
+                 max_batch: int = 20,
+                 max_retries: int = 5,
+                 backoff: float = 1.0,
+                 timeout: float = 5.0):
+        self.url = url
+        self.coalesce_window = coalesce_window
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.__queue = Queue(maxsize)
+        self.__session = requests.Session()
+        self.__thread = None
+        if url:
+            self.__thread = Thread(target=self.__run, name='SlackNotifier', daemon=True)
+            self.__thread.start()
+
+    def send(self, msg: str) -> bool:
+        '''
+        Returns
+        -------
+        bool
+            False if the message was dropped
+        '''
+        if not self.url:
+            return False
+        try:
+            self.__queue.put_nowait(msg)
+            return True
+        except Full:
+            self.dropped += 1
+            logger.warning(f'Dropped a slack message because the queue is full. dropped={self.dropped}')
+            return False
+
+    def flush(self, timeout: float = 10.0) -> None:
+        '''
+        Wait until the queued messages are posted, e.g. before exiting.
+        '''
+        deadline = time.time() + timeout
+        while self.__thread and self.__queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+    def __run(self) -> None:
+        while True:
+            batch = [self.__queue.get()]
+            deadline = time.time() + self.coalesce_window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.__queue.get(timeout=max(deadline - time.time(), 0)))
+                except Empty:
+                    break
+            try:
+                self.__post('\n'.join(batch), len(batch))
+            finally:
+                for _ in batch:
+                    self.__queue.task_done()
+
+    def __post(self, text: str, n: int) -> None:
+        wait = self.backoff
+        for i in range(self.max_retries + 1):
+            try:
+                res = self.__session.post(self.url, data=json.dumps({'text': text}), timeout=self.timeout)
+                if res.status_code == 429:
+                    wait = max(wait, float(res.headers.get('Retry-After', wait)))
+                    raise requests.HTTPError('rate limited by slack')
+                res.raise_for_status()
+                self.sent += n
+                return
+            except requests.RequestException as e:
+                if i == self.max_retries:
+                    self.failed += n
+                    logger.error(f'Failed to post {n} slack messages: {e}. failed={self.failed}')
+                    return
+                logger.warning(f'Failed to post slack message: {e}. Retry after {wait:.1f} seconds.')
+                time.sleep(wait * random.uniform(0.5, 1.5))
+                wait *= 2
@@ -0,0 +1,112 @@
+from concurrent.futures import Future
+from logging import getLogger
+from threading import Condition, Thread
+import time
+
+from api import BybitAPIError, InversePerp
+from metrics import Counter
+
+
+logger = getLogger(__name__)
+
+
+ORDERS = Counter('frbot_orders_total', 'Orders created, cancelled, replaced and filled.', ('event',))
+_EVENTS = {'create': 'created', 'cancel': 'cancelled', 'replace': 'replaced'}
+
+ORDER_TIMEOUT = 30
+'''seconds to wait for the result of an order request, which covers its retries'''
+
+
+class OrderManagerStopped(BybitAPIError):
+    '''
+    Raised for order requests not sent before the manager was stopped.
+    '''
+
+
+class OrderManager(object):
+    '''
+    Coalesces order requests of all symbols into rounds.
+
+    Requests submitted by the chase loops within `window` seconds of the
+    first one are sent together concurrently, so repricing every symbol
+    costs one round trip instead of one per symbol.
+
+    Parameters
+    ----------
+    window: float
+        seconds to wait for other requests after the first one of a round
+    '''
+
+    def __init__(self, client: InversePerp, window: float = 0.02):
+        self.__client = client
+        self.__window = window
+        self.__cond = Condition()
+        self.__pending = []
+        self.__alive = True
+        self.rounds = 0
+        self.requests = 0
+        Thread(target=self.__run, name='OrderManager', daemon=True).start()
+
+    def create(self, **params) -> Future:
+        return self.__submit('create', params)
+
+    def cancel(self, **params) -> Future:
+        return self.__submit('cancel', params)
+
+    def replace(self, **params) -> Future:
+        return self.__submit('replace', params)
+
+    def stop(self) -> None:
+        '''
+        Stop sending requests. The requests not sent yet fail with OrderManagerStopped,
+        so that no caller waits for them.
+        '''
+        with self.__cond:
+            self.__alive = False
+            pending, self.__pending = self.__pending, []
+            self.__cond.notify()
+        for kind, _, f in pending:
+            f.set_exception(OrderManagerStopped(f'Order manager was stopped before sending {kind}.'))
+
+    def __submit(self, kind: str, params: dict) -> Future:
+        future = Future()
+        with self.__cond:
+            if self.__alive:
+                self.__pending.append((kind, params, future))
+                self.__cond.notify()
+                return future
+        future.set_exception(OrderManagerStopped(f'Order manager was stopped before sending {kind}.'))
+        return future
+
+    def __run(self) -> None:
+        while True:
+            with self.__cond:
+                while self.__alive and not self.__pending:
+                    self.__cond.wait()
+                if not self.__alive:
+                    return
+            time.sleep(self.__window)
+            with self.__cond:
+                pending, self.__pending = self.__pending, []
+            if pending:
+                self.__flush(pending)
+
+    def __flush(self, pending: list) -> None:
+        self.rounds += 1
+        self.requests += len(pending)
+        logger.debug(f'Send a round of {len(pending)} order requests.')
+        methods = {
+            'create': self.__client.private_order_create,
+            'cancel': self.__client.private_order_cancel,
+            'replace': self.__client.private_order_replace,
+        }
+        try:
+            results = self.__client.batch([(methods[k], p) for k, p, _ in pending])
+        except Exception as e:
+            results = [e] * len(pending)
+        for (k, _, f), r in zip(pending, results):
+            if isinstance(r, Exception):
+                f.set_exception(r)
+            else:
+                ORDERS.inc(_EVENTS[k])
+                f.set_result(r)
@@ -0,0 +1,171 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging import getLogger
+from threading import Lock
+import asyncio
+import time
+
+
+logger = getLogger(__name__)
+
+
+PRIORITY_HIGH = 0
+'''priority of trading requests, allowed to use all tokens of a bucket'''
+
+PRIORITY_LOW = 1
+'''priority of reporting requests, which leave the reserved tokens to trading'''
+
+RATE_LIMITS = {
+    'order': (100, 60),
+    'order_query': (600, 60),
+    'position': (120, 60),
+    'wallet': (120, 60),
+    'public': (50, 1),
+}
+'''(requests, seconds) of each endpoint group'''
+
+ENDPOINT_GROUPS = {
+    '/v2/private/order/create': 'order',
+    '/v2/private/order/cancel': 'order',
+    '/v2/private/order/replace': 'order',
+    '/v2/private/order/cancelAll': 'order',
+    '/v2/private/order': 'order_query',
+    '/v2/private/position/list': 'position',
+    '/v2/private/wallet/balance': 'wallet',
+    '/v2/private/wallet/fund/records': 'wallet',
+    '/v2/private/funding/prev-funding': 'wallet',
+    '/private/linear/order/create': 'order',
+    '/private/linear/order/cancel': 'order',
+    '/private/linear/order/replace': 'order',
+    '/private/linear/order/search': 'order_query',
+    '/private/linear/position/list': 'position',
+}
+'''endpoint group of each path. paths not listed here belong to "public".'''
+
+_priority = ContextVar('priority', default=PRIORITY_HIGH)
+
+
+@contextmanager
+def priority(p: int):
+    '''
+    Send the requests made in this context with the priority.
+    '''
+    token = _priority.set(p)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket(object):
+
+    def __init__(self, capacity: int, period: float, reserve: float = 0.2):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.reserve = capacity * reserve
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+
+    def try_acquire(self, p: int) -> tuple:
+        '''
+        Returns
+        -------
+        tuple
+            (granted, seconds to wait). a granted request has to wait
+            before being sent; a request not granted has to retry after waiting.
+        '''
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+        if self.blocked_until > now:
+            return p == PRIORITY_HIGH and self.__take(), self.blocked_until - now
+
+        floor = 1 if p == PRIORITY_HIGH else self.reserve + 1
+        if self.tokens >= floor:
+            self.__take()
+            return True, 0.0
+        wait = (floor - self.tokens) / self.rate
+        if p == PRIORITY_HIGH:
+            # queue behind the requests already granted
+            self.__take()
+        return p == PRIORITY_HIGH, wait
+
+    def update(self, remaining: int, reset_at: float) -> None:
+        '''
+        Correct the bucket by the limit status returned by the server.
+        '''
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0 and reset_at:
+            self.blocked_until = time.monotonic() + max(reset_at - time.time(), 0)
+
+    def __take(self) -> bool:
+        self.tokens -= 1
+        self.requests += 1
+        return True
+
+
+class RateLimiter(object):
+    '''
+    Client side rate limiter with one token bucket per endpoint group.
+
+    Low priority requests wait while the tokens of the bucket are below
+    its reserve, so order requests are not blocked by reporting.
+    '''
+
+    def __init__(self, limits: dict = RATE_LIMITS, reserve: float = 0.2):
+        self.__lock = Lock()
+        self.__buckets = {g: TokenBucket(n, sec, reserve) for g, (n, sec) in limits.items()}
+
+    def acquire(self, path: str) -> None:
+        while True:
+            granted, wait = self.__try_acquire(path)
+            if wait > 0:
+                time.sleep(wait)
+            if granted:
+                return
+
+    async def acquire_async(self, path: str) -> None:
+        while True:
+            granted, wait = self.__try_acquire(path)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if granted:
+                return
+
+    def update(self, path: str, remaining: int, reset_ms: int = None) -> None:
+        if remaining is None:
+            return
+        with self.__lock:
+            self.__bucket(path).update(int(remaining), int(reset_ms) / 1000 if reset_ms else None)
+
+    def stats(self) -> dict:
+        '''
+        Returns
+        -------
+        dict
+            number of requests, throttled requests and seconds spent
+            on throttling of each endpoint group
+        '''
+        with self.__lock:
+            return {g: {'requests': b.requests,
+                        'throttled': b.throttled,
+                        'throttled_seconds': round(b.throttled_seconds, 3)}
+                    for g, b in self.__buckets.items()}
+
+    def __bucket(self, path: str) -> TokenBucket:
+        return self.__buckets[ENDPOINT_GROUPS.get(path, 'public')]
+
+    def __try_acquire(self, path: str) -> tuple:
+        with self.__lock:
+            b = self.__bucket(path)
+            granted, wait = b.try_acquire(_priority.get())
+            if wait > 0:
+                b.throttled += 1
+                b.throttled_seconds += wait
+                logger.debug(f'Throttle {path} for {wait:.3f} seconds.')
+            return granted, wait
@@ -3,6 +3,7 @@
 LOG_DIR=/var/log
 TZ=Asia/Tokyo
 IMAGE_NAME=bybit-fr-bot
+DATA_DIR=/var/lib/$IMAGE_NAME
 CONTAINER_NAME=$IMAGE_NAME
 
 docker stop $CONTAINER_NAME > /dev/null 2>&1
@@ -12,6 +13,7 @@ docker rm $CONTAINER_NAME > /dev/null 2>&1
 docker run \
   -d \
   -v $LOG_DIR:/home/root/logs \
+  -v $DATA_DIR:/home/root/data \
   -e TZ=$TZ \
   --name $CONTAINER_NAME \
   $IMAGE_NAME:latest
@@ -0,0 +1,124 @@
+from logging import getLogger
+
+import numpy as np
+
+from market import MarketData
+
+
+logger = getLogger(__name__)
+
+
+def _column(tickers: list, key: str, fallback: str = None) -> np.ndarray:
+    '''
+    Returns
+    -------
+    np.ndarray
+        float values of the key, or of the fallback key where the key is
+        missing or empty. nan if both are.
+    '''
+    def value(t):
+        v = t.get(key)
+        if v in (None, '') and fallback:
+            v = t.get(fallback)
+        return v if v not in (None, '') else 'nan'
+    return np.array([value(t) for t in tickers], dtype=float)
+
+
+def rank(tickers: list,
+         min_fr: float = 0.0,
+         min_turnover: float = 0.0,
+         max_spread: float = 0.001,
+         spread_weight: float = 1.0) -> list:
+    '''
+    Rank symbols by the funding rate their short position is expected to
+    receive, net of the spread paid when the position is closed.
+
+    Parameters
+    ----------
+    tickers: list
+        tickers returned by public_tickers
+    min_fr: float
+        symbols whose funding rate is less than this are excluded
+    min_turnover: float
+        symbols whose 24h turnover is less than this are excluded
+    max_spread: float
+        symbols whose spread relative to the mid price is more than this are excluded
+    spread_weight: float
+        weight of the relative spread subtracted from the funding rate
+
+    Returns
+    -------
+    list
+        (symbol, score, funding rate) of the symbols not excluded, best first
+    '''
+    if not tickers:
+        return []
+    symbols = np.array([t['symbol'] for t in tickers])
+    fr = _column(tickers, 'predicted_funding_rate', 'funding_rate')
+    turnover = _column(tickers, 'turnover_24h')
+    bid = _column(tickers, 'bid_price')
+    ask = _column(tickers, 'ask_price')
+
+    spread = (ask - bid) / ((ask + bid) / 2)
+    score = fr - spread_weight * spread
+    # nan compares as False, so symbols missing prices or funding rates are excluded
+    ok = (fr >= min_fr) & (spread <= max_spread) & ((turnover >= min_turnover) | (min_turnover <= 0))
+    idx = np.flatnonzero(ok)
+    # best score first, the higher turnover first among the same score
+    idx = idx[np.lexsort((-np.nan_to_num(turnover[idx]), -score[idx]))]
+    return [(str(symbols[i]), float(score[i]), float(fr[i])) for i in idx]
+
+
+class UniverseScanner(object):
+    '''
+    Picks the symbols to trade in a funding window from the tickers of
+    the whole market, fetched by one request.
+
+    Parameters
+    ----------
+    market: MarketData
+        gives the public client and the symbols which can be traded
+    max_symbols: int
+        max number of symbols picked
+    '''
+
+    def __init__(self,
+                 market: MarketData,
+                 max_symbols: int = 4,
+                 min_fr: float = 0.0,
+                 min_turnover: float = 0.0,
+                 max_spread: float = 0.001,
+                 spread_weight: float = 1.0):
+        self.market = market
+        self.max_symbols = max_symbols
+        self.min_fr = min_fr
+        self.min_turnover = min_turnover
+        self.max_spread = max_spread
+        self.spread_weight = spread_weight
+
+    def scan(self, symbols: list = None) -> list:
+        '''
+        Parameters
+        ----------
+        symbols: list
+            symbols to rank. all symbols of the market if None.
+
+        Returns
+        -------
+        list
+            (symbol, score, funding rate) of the ranked symbols, best first
+        '''
+        universe = set(symbols if symbols is not None else self.market.symbols)
+        tickers = [t for t in self.market.tickers() if t['symbol'] in universe]
+        return rank(tickers, self.min_fr, self.min_turnover, self.max_spread, self.spread_weight)
+
+    def select(self, symbols: list = None) -> list:
+        '''
+        Returns
+        -------
+        list
+            the best max_symbols symbols
+        '''
+        ranked = self.scan(symbols)[:self.max_symbols]
+        logger.info('Selected symbols: ' + ', '.join(f'{s}(fr={fr:.6%}, score={score:.6%})' for s, score, fr in ranked))
+        return [s for s, _, _ in ranked]
@@ -0,0 +1,77 @@
+from logging import getLogger
+from threading import Event, Lock, Thread
+import heapq
+import itertools
+import time
+
+from log import error_message
+
+
+logger = getLogger(__name__)
+
+
+DEFAULT_FUNDING_INTERVAL = 8 * 60
+'''minutes between funding times when a symbol does not tell its interval'''
+
+
+def next_funding_time(now: float, interval_minutes: int = DEFAULT_FUNDING_INTERVAL) -> float:
+    '''
+    Returns
+    -------
+    float
+        unix time of the first funding time after now.
+        funding times are multiples of the interval from 00:00 UTC.
+    '''
+    interval = interval_minutes * 60
+    return now - now % interval + interval
+
+
+class Scheduler(object):
+    '''
+    Runs jobs at given unix times.
+
+    Jobs are kept in a heap ordered by time, and the scheduler thread sleeps
+    until the earliest one is due instead of polling the clock. Each job runs
+    on its own thread so that a long job does not delay the next one.
+    '''
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__wakeup = Event()
+        self.__jobs = []
+        self.__seq = itertools.count()
+        self.__alive = False
+
+    def at(self, when: float, job, *args) -> None:
+        with self.__lock:
+            heapq.heappush(self.__jobs, (when, next(self.__seq), job, args))
+        logger.info(f"Scheduled {job.__name__} at {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(when))} UTC.")
+        # the new job may be earlier than the one being waited for
+        self.__wakeup.set()
+
+    def run(self) -> None:
+        self.__alive = True
+        while self.__alive:
+            with self.__lock:
+                when, _, job, args = self.__jobs[0] if self.__jobs else (None, None, None, None)
+                if when is not None and when <= time.time():
+                    heapq.heappop(self.__jobs)
+                else:
+                    job = None
+            if job:
+                logger.info(f'Run {job.__name__}{args}, {(time.time() - when) * 1000:.1f} ms after the deadline.')
+                Thread(target=self.__run_job, args=(job, args), name=job.__name__).start()
+                continue
+            self.__wakeup.wait(when - time.time() if when is not None else None)
+            self.__wakeup.clear()
+
+    def stop(self) -> None:
+        self.__alive = False
+        self.__wakeup.set()
+
+    def __run_job(self, job, args) -> None:
+        try:
+            job(*args)
+        except Exception as e:
+            logger.error(f'Failed to run {job.__name__}')
+            logger.error(error_message(e, traceback=True))
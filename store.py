@@ -0,0 +1,294 @@
+'''
+Local history of what the bot observes: funding rates, funding fees,
+order lifecycles, fills, balances and wallet fund records.
+
+Rows are appended to a SQLite database in WAL mode, indexed by
+(symbol, ts), so that range queries for reporting and analysis are
+served locally without requests to Bybit.
+
+Export funding rates in the csv format read by backtest.py:
+
+    pipenv run python store.py --db data/frbot.db export-funding-rates > fr.csv
+
+Backfill from the api with the keys of the environment:
+
+    pipenv run python store.py --db data/frbot.db backfill
+'''
+from datetime import datetime
+from logging import getLogger
+from threading import Lock
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+
+logger = getLogger(__name__)
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS funding_rates (
+    symbol TEXT NOT NULL, ts REAL NOT NULL, funding_rate REAL NOT NULL,
+    PRIMARY KEY (symbol, ts));
+CREATE TABLE IF NOT EXISTS fundings (
+    symbol TEXT NOT NULL, ts REAL NOT NULL, side TEXT, size REAL, funding_rate REAL, exec_fee REAL,
+    PRIMARY KEY (symbol, ts));
+CREATE TABLE IF NOT EXISTS order_events (
+    symbol TEXT NOT NULL, ts REAL NOT NULL, order_id TEXT NOT NULL, event TEXT NOT NULL,
+    side TEXT, price REAL, qty REAL, cum_exec_qty REAL);
+CREATE INDEX IF NOT EXISTS order_events_symbol_ts ON order_events (symbol, ts);
+CREATE TABLE IF NOT EXISTS fills (
+    exec_id TEXT PRIMARY KEY, symbol TEXT NOT NULL, ts REAL NOT NULL, order_id TEXT,
+    side TEXT, price REAL, exec_qty REAL, exec_fee REAL, is_maker INTEGER);
+CREATE INDEX IF NOT EXISTS fills_symbol_ts ON fills (symbol, ts);
+CREATE TABLE IF NOT EXISTS balances (
+    coin TEXT NOT NULL, ts REAL NOT NULL, wallet_balance REAL, unrealised_pnl REAL,
+    PRIMARY KEY (coin, ts));
+CREATE TABLE IF NOT EXISTS fund_records (
+    id INTEGER PRIMARY KEY, coin TEXT NOT NULL, ts REAL NOT NULL, type TEXT, amount REAL, wallet_balance REAL);
+CREATE INDEX IF NOT EXISTS fund_records_coin_ts ON fund_records (coin, ts);
+'''
+
+
+def to_ts(v) -> float:
+    '''
+    Returns
+    -------
+    float
+        unix time of a timestamp given in seconds or as an ISO 8601 string
+    '''
+    if isinstance(v, str):
+        try:
+            return float(v)
+        except ValueError:
+            return datetime.fromisoformat(v.replace('Z', '+00:00')).timestamp()
+    return float(v)
+
+
+class Store(object):
+    '''
+    Append-only history database shared by the threads of a bot.
+
+    Parameters
+    ----------
+    path: str
+        file of the database. parent directories are created.
+    '''
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.__lock = Lock()
+        self.__conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.__conn.execute('PRAGMA journal_mode=WAL')
+        # commits are not synced to disk one by one, a crash may only lose the last ones
+        self.__conn.execute('PRAGMA synchronous=NORMAL')
+        self.__conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__conn.close()
+
+    def __write(self, sql: str, rows: list) -> None:
+        if not rows:
+            return
+        with self.__lock:
+            try:
+                self.__conn.execute('BEGIN')
+                self.__conn.executemany(sql, rows)
+                self.__conn.execute('COMMIT')
+            except sqlite3.Error as e:
+                # history is not worth stopping the bot for
+                logger.error(f'Failed to write to {self.path}: {e}')
+                if self.__conn.in_transaction:
+                    self.__conn.execute('ROLLBACK')
+
+    def __read(self, sql: str, params: tuple) -> list:
+        with self.__lock:
+            return self.__conn.execute(sql, params).fetchall()
+
+    #
+    # writes
+    #
+
+    def add_funding_rate(self, prev_fr: dict) -> None:
+        '''
+        Parameters
+        ----------
+        prev_fr: dict
+            result of public_funding_prevfundingrate
+        '''
+        self.__write('INSERT OR IGNORE INTO funding_rates VALUES (?, ?, ?)',
+                     [(prev_fr['symbol'], to_ts(prev_fr['funding_rate_timestamp']), float(prev_fr['funding_rate']))])
+
+    def add_funding(self, funding: dict) -> None:
+        '''
+        Parameters
+        ----------
+        funding: dict
+            result of private_funding_prevfunding
+        '''
+        if not funding or not funding.get('symbol'):
+            return
+        ts = to_ts(funding['exec_timestamp'])
+        self.__write('INSERT OR IGNORE INTO fundings VALUES (?, ?, ?, ?, ?, ?)',
+                     [(funding['symbol'], ts, funding['side'], float(funding['size']),
+                       float(funding['funding_rate']), float(funding['exec_fee']))])
+        self.__write('INSERT OR IGNORE INTO funding_rates VALUES (?, ?, ?)',
+                     [(funding['symbol'], ts, float(funding['funding_rate']))])
+
+    def add_order_event(self, event: str, symbol: str, order_id: str, side: str = None,
+                        price=None, qty=None, cum_exec_qty=None) -> None:
+        '''
+        Parameters
+        ----------
+        event: str
+            created, replaced, cancelled, filled, or the order_status when the
+            exchange cancelled or rejected the order
+        '''
+        self.__write('INSERT INTO order_events VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                     [(symbol, time.time(), order_id, event, side,
+                       None if price is None else float(price),
+                       None if qty is None else float(qty),
+                       None if cum_exec_qty is None else float(cum_exec_qty))])
+
+    def add_fill(self, execution: dict) -> None:
+        '''
+        Parameters
+        ----------
+        execution: dict
+            data of the execution topic of the private stream
+        '''
+        self.__write('INSERT OR IGNORE INTO fills VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                     [(execution['exec_id'], execution['symbol'], to_ts(execution['trade_time']),
+                       execution['order_id'], execution['side'], float(execution['price']),
+                       float(execution['exec_qty']), float(execution['exec_fee']),
+                       int(bool(execution.get('is_maker'))))])
+
+    def add_balances(self, balance: dict) -> None:
+        '''
+        Parameters
+        ----------
+        balance: dict
+            Balance by coin, or the result of private_wallet_balance
+        '''
+        now = time.time()
+        self.__write('INSERT OR IGNORE INTO balances VALUES (?, ?, ?, ?)',
+                     [(coin, now, float(v['wallet_balance']), float(v['unrealised_pnl']))
+                      for coin, v in balance.items() if v['wallet_balance']])
+
+    def add_fund_records(self, records: list) -> None:
+        '''
+        Parameters
+        ----------
+        records: list
+            data of the result of private_wallet_fund_records
+        '''
+        self.__write('INSERT OR IGNORE INTO fund_records VALUES (?, ?, ?, ?, ?, ?)',
+                     [(int(r['id']), r['coin'], to_ts(r['exec_time']), r['type'],
+                       float(r['amount']), float(r['wallet_balance'])) for r in records])
+
+    #
+    # queries
+    #
+
+    def funding_rates(self, symbol: str, start: float = 0, end: float = float('inf')) -> tuple:
+        '''
+        Returns
+        -------
+        tuple
+            sorted timestamps and funding rates in [start, end),
+            in the same form as backtest.load_funding
+        '''
+        rows = self.__read('SELECT ts, funding_rate FROM funding_rates '
+                           'WHERE symbol = ? AND ts >= ? AND ts < ? ORDER BY ts', (symbol, start, end))
+        a = np.array(rows, dtype=float).reshape(-1, 2)
+        return a[:, 0], a[:, 1]
+
+    def query(self, table: str, key: str, start: float = 0, end: float = float('inf')) -> list:
+        '''
+        Parameters
+        ----------
+        table: str
+            one of fundings, order_events, fills, balances and fund_records
+        key: str
+            symbol, or coin of balances and fund_records
+
+        Returns
+        -------
+        list
+            rows in [start, end) as dicts, ordered by time
+        '''
+        if table not in ('fundings', 'order_events', 'fills', 'balances', 'fund_records'):
+            raise ValueError(f'Unknown table: {table}')
+        column = 'coin' if table in ('balances', 'fund_records') else 'symbol'
+        with self.__lock:
+            cur = self.__conn.execute(f'SELECT * FROM {table} WHERE {column} = ? AND ts >= ? AND ts < ? ORDER BY ts',
+                                      (key, start, end))
+            names = [d[0] for d in cur.description]
+            return [dict(zip(names, r)) for r in cur.fetchall()]
+
+    def symbols(self) -> list:
+        return [r[0] for r in self.__read('SELECT DISTINCT symbol FROM funding_rates ORDER BY symbol', ())]
+
+    #
+    # backfill
+    #
+
+    def backfill(self, client, symbols: list, page_size: int = 50) -> None:
+        '''
+        Fill the history of the account from the api.
+
+        Parameters
+        ----------
+        client: InversePerp
+            authenticated client of the account
+        '''
+        for s in symbols:
+            self.add_funding(client.private_funding_prevfunding(s))
+            self.add_funding_rate(client.public_funding_prevfundingrate(s))
+        page = 1
+        while True:
+            res = client.private_wallet_fund_records(page=page, limit=page_size)
+            records = (res or {}).get('data') or []
+            self.add_fund_records(records)
+            logger.info(f'Backfilled {len(records)} wallet fund records of page {page}.')
+            if len(records) < page_size:
+                break
+            page += 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Query or backfill the history database.')
+    parser.add_argument('--db', default=os.environ.get('STORE_PATH', 'data/frbot.db'))
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('backfill')
+    export = sub.add_parser('export-funding-rates', help='write csv for backtest.py')
+    export.add_argument('--symbol', action='append', help='all symbols if omitted')
+    export.add_argument('--start', type=float, default=0)
+    export.add_argument('--end', type=float, default=float('inf'))
+    args = parser.parse_args()
+
+    store = Store(args.db)
+    if args.command == 'backfill':
+        from api import InversePerp
+        from constants import INV_PERP_SYMBOLS
+        client = InversePerp(os.environ['BYBIT_APIKEY'], os.environ['BYBIT_SECRET'],
+                             os.environ['BYBIT_TEST'].lower() == 'true')
+        store.backfill(client, INV_PERP_SYMBOLS)
+    else:
+        w = csv.writer(sys.stdout)
+        w.writerow(['timestamp', 'symbol', 'funding_rate'])
+        for s in args.symbol or store.symbols():
+            for t, fr in zip(*store.funding_rates(s, args.start, args.end)):
+                w.writerow([int(t), s, fr])
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+'''
+Entry and exit rules of the funding rate strategy.
+
+The rules are written with operators that work for both scalars
+and numpy arrays, so the bot and the backtester share them.
+'''
+
+
+def should_exit(position_size, fr, min_exit_fr):
+    '''
+    Close the short position when the previous funding rate is less than min_exit_fr.
+    '''
+    return (position_size > 0) & (fr < min_exit_fr)
+
+
+def should_enter(fr, min_entry_fr):
+    '''
+    Create a short position when the previous funding rate is min_entry_fr or more.
+    '''
+    return fr >= min_entry_fr
@@ -0,0 +1,369 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from logging import getLogger
+from threading import Event, Lock, Thread
+from typing import Callable
+import hashlib
+import hmac
+import time
+
+import websocket
+
+from constants import MAINNET_WSS, TESTNET_WSS
+from fastjson import dumps, loads
+from models import Level, Order, Position
+
+
+logger = getLogger(__name__)
+
+
+class BybitStream(object):
+    '''
+    Base client of Bybit websocket API.
+
+    Runs the connection on a daemon thread, subscribes the topics on every
+    (re)connect and sends the heartbeat required by the server.
+    Subclasses implement `_topics` and `_on_data`.
+    '''
+
+    PING_INTERVAL = 20
+    RECONNECT_WAIT_MAX = 30
+
+    def __init__(self, test: bool = True):
+        self.__url = TESTNET_WSS if test else MAINNET_WSS
+        self.__ws = None
+        self.__alive = False
+        self.__thread = None
+        self.__listeners = []
+
+    def add_listener(self, listener: Callable[[str], None]) -> None:
+        '''
+        Register a callback called with a symbol whenever its state changes.
+        '''
+        self.__listeners.append(listener)
+
+    def _notify(self, symbol: str) -> None:
+        for listener in self.__listeners:
+            listener(symbol)
+
+    def start(self) -> None:
+        if self.__alive:
+            return
+        self.__alive = True
+        self.__thread = Thread(target=self.__run, name=self.__class__.__name__, daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__alive = False
+        if self.__ws:
+            self.__ws.close()
+
+    def send(self, msg: dict) -> None:
+        self.__ws.send(dumps(msg))
+
+    def _topics(self) -> list:
+        raise NotImplementedError
+
+    def _on_data(self, msg: dict) -> None:
+        raise NotImplementedError
+
+    def _on_open(self) -> None:
+        self.send({'op': 'subscribe', 'args': self._topics()})
+
+    def _on_close(self) -> None:
+        pass
+
+    def __run(self) -> None:
+        wait = 1
+        while self.__alive:
+            opened_at = time.time()
+            self.__ws = websocket.WebSocketApp(
+                    self.__url,
+                    on_open=lambda ws: self._on_open(),
+                    on_message=lambda ws, msg: self.__on_message(msg),
+                    on_error=lambda ws, e: logger.error(f'Websocket error: {e}'))
+            logger.info(f'Connect to {self.__url}')
+            heartbeat = Thread(target=self.__heartbeat, args=(self.__ws,), daemon=True)
+            heartbeat.start()
+            self.__ws.run_forever()
+            self._on_close()
+            if not self.__alive:
+                break
+            if time.time() - opened_at > self.RECONNECT_WAIT_MAX:
+                wait = 1
+            logger.info(f'Websocket was closed. Reconnect after {wait} seconds.')
+            time.sleep(wait)
+            wait = min(wait * 2, self.RECONNECT_WAIT_MAX)
+
+    def __heartbeat(self, ws) -> None:
+        while self.__alive and ws is self.__ws:
+            time.sleep(self.PING_INTERVAL)
+            try:
+                if ws.sock and ws.sock.connected:
+                    ws.send(dumps({'op': 'ping'}))
+            except Exception as e:
+                logger.warning(f'Failed to send ping: {e}')
+
+    def __on_message(self, raw: str) -> None:
+        msg = loads(raw)
+        if 'topic' not in msg:
+            if msg.get('success') is False:
+                logger.error(f'Websocket request was rejected: {msg}')
+            return
+        try:
+            self._on_data(msg)
+        except Exception as e:
+            logger.exception(e)
+
+
+class OrderBook(object):
+    '''
+    Local L2 order book of one symbol.
+
+    Prices of each side are kept sorted in ascending order, so the best bid
+    is the last element of `bids` and the best ask is the first of `asks`.
+    '''
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.levels = {}
+        self.bids = []
+        self.asks = []
+        self.lock = Lock()
+        self.ready = Event()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.ready.clear()
+            self.levels.clear()
+            self.bids.clear()
+            self.asks.clear()
+
+    def snapshot(self, data: list) -> None:
+        with self.lock:
+            self.levels.clear()
+            self.bids.clear()
+            self.asks.clear()
+            for d in data:
+                self.__insert(d)
+            self.ready.set()
+
+    def delta(self, data: dict) -> None:
+        with self.lock:
+            for d in data.get('delete', []):
+                self.__delete(d)
+            for d in data.get('update', []):
+                level = self.levels.get(d['id'])
+                if level:
+                    level.size = d['size']
+            for d in data.get('insert', []):
+                self.__insert(d)
+
+    def best(self, side: str) -> tuple:
+        '''
+        Parameters
+        ----------
+        side: str
+            'Buy' for the best bid, 'Sell' for the best ask
+
+        Returns
+        -------
+        tuple
+            (price, size) of the best level, or None if the book is empty
+        '''
+        with self.lock:
+            prices = self.bids if side == 'Buy' else self.asks
+            if not prices:
+                return None
+            level = self.levels[prices[-1 if side == 'Buy' else 0][1]]
+            return level.price_str, level.size
+
+    def __insert(self, d: dict) -> None:
+        if d['id'] in self.levels:
+            self.__delete(d)
+        level = self.levels[d['id']] = Level(d['price'], d['side'], d['size'])
+        insort(self.bids if level.side == 'Buy' else self.asks, (level.price, d['id']))
+
+    def __delete(self, d: dict) -> None:
+        level = self.levels.pop(d['id'], None)
+        if not level:
+            return
+        prices = self.bids if level.side == 'Buy' else self.asks
+        key = (level.price, d['id'])
+        i = bisect_left(prices, key)
+        if i < len(prices) and prices[i] == key:
+            del prices[i]
+
+
+class OrderBookStream(BybitStream):
+    '''
+    Keeps local order books of inverse perpetuals up to date
+    from the orderBookL2 snapshot and delta feed.
+    '''
+
+    def __init__(self, symbols: list, test: bool = True, depth: int = 25):
+        super().__init__(test)
+        self.__depth = depth
+        self.books = {s: OrderBook(s) for s in symbols}
+
+    def best(self, symbol: str, side: str) -> tuple:
+        book = self.books.get(symbol)
+        if not book or not book.ready.is_set():
+            return None
+        return book.best(side)
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        deadline = time.time() + timeout if timeout is not None else None
+        for b in self.books.values():
+            t = max(deadline - time.time(), 0) if deadline else None
+            if not b.ready.wait(t):
+                return False
+        return True
+
+    def _topics(self) -> list:
+        return [f'orderBookL2_{self.__depth}.{s}' for s in self.books]
+
+    def _on_close(self) -> None:
+        # deltas are lost while disconnected, so wait for the next snapshot
+        for b in self.books.values():
+            b.clear()
+
+    def _on_data(self, msg: dict) -> None:
+        book = self.books.get(msg['topic'].split('.')[-1])
+        if not book:
+            return
+        before = (book.best('Buy'), book.best('Sell'))
+        if msg['type'] == 'snapshot':
+            data = msg['data']
+            book.snapshot(data['order_book'] if isinstance(data, dict) else data)
+        elif msg['type'] == 'delta':
+            book.delta(msg['data'])
+        if (book.best('Buy'), book.best('Sell')) != before:
+            self._notify(book.symbol)
+
+
+class InstrumentStream(BybitStream):
+    '''
+    Keeps mark and index prices of perpetuals up to date from the
+    instrument_info feed, whose deltas carry only the fields changed.
+    '''
+
+    def __init__(self, symbols: list, test: bool = True):
+        super().__init__(test)
+        self.symbols = list(symbols)
+        self.prices = {}
+        '''(mark price, index price) by symbol'''
+
+    def _topics(self) -> list:
+        return [f'instrument_info.100ms.{s}' for s in self.symbols]
+
+    def _on_data(self, msg: dict) -> None:
+        if msg['type'] == 'snapshot':
+            data = [msg['data']]
+        else:
+            data = msg['data'].get('update', [])
+        for d in data:
+            symbol = d['symbol']
+            mark, index = self.prices.get(symbol, (None, None))
+            mark = _price(d, 'mark_price', mark)
+            index = _price(d, 'index_price', index)
+            if mark is None or index is None:
+                continue
+            self.prices[symbol] = (mark, index)
+            self._notify(symbol)
+
+
+def _price(d: dict, key: str, default: float) -> float:
+    # inverse perpetuals send the prices as integers of 1e-4 in the `_e4` fields
+    if d.get(f'{key}_e4') is not None:
+        return int(d[f'{key}_e4']) / 10000
+    if d.get(key) is not None:
+        return float(d[key])
+    return default
+
+
+class PrivateStream(BybitStream):
+    '''
+    Receives state changes of own orders, executions and positions.
+
+    The latest state of each order is kept by order_id and each
+    position by symbol, so callers can read them without rest api calls.
+    They are kept as models, which are replaced on each update and so
+    returned without copying. An order leaves `orders` once it is filled,
+    cancelled or rejected, and only the last `finished_capacity` of those
+    are kept for the chases reading their final state.
+    '''
+
+    TOPICS = ['order', 'execution', 'position']
+    FINAL_STATUS = ('Filled', 'Cancelled', 'Rejected')
+
+    def __init__(self, api_key: str, api_secret: str, test: bool = True, finished_capacity: int = 1000):
+        super().__init__(test)
+        self.__api_key = api_key
+        self.__api_secret = api_secret
+        self.__lock = Lock()
+        self.__execution_listeners = []
+        self.orders = {}
+        self.positions = {}
+        self.finished_capacity = finished_capacity
+        self.__finished = OrderedDict()
+
+    def add_execution_listener(self, listener: Callable[[dict], None]) -> None:
+        '''
+        Register a callback called with each execution of own orders.
+        '''
+        self.__execution_listeners.append(listener)
+
+    def order(self, order_id: str) -> Order:
+        return self.orders.get(order_id) or self.__finished.get(order_id)
+
+    def position(self, symbol: str) -> Position:
+        return self.positions.get(symbol)
+
+    def _topics(self) -> list:
+        return self.TOPICS
+
+    def _on_close(self) -> None:
+        # updates are lost while disconnected, so let callers use rest api
+        with self.__lock:
+            self.orders.clear()
+            self.__finished.clear()
+            self.positions.clear()
+
+    def _on_open(self) -> None:
+        expires = int((time.time() + 10) * 1000)
+        signature = hmac.new(
+                bytes(self.__api_secret, 'utf-8'),
+                f'GET/realtime{expires}'.encode('utf-8'), hashlib.sha256).hexdigest()
+        self.send({'op': 'auth', 'args': [self.__api_key, expires, signature]})
+        super()._on_open()
+
+    def _on_data(self, msg: dict) -> None:
+        topic = msg['topic']
+        symbols = set()
+        if topic == 'execution':
+            for d in msg['data']:
+                for listener in self.__execution_listeners:
+                    listener(d)
+        with self.__lock:
+            for d in msg['data']:
+                symbols.add(d['symbol'])
+                if topic == 'order':
+                    self.__update_order(Order.from_dict(d))
+                elif topic == 'execution':
+                    logger.info(f"Execution: symbol={d['symbol']}, side={d['side']}, "
+                                f"price={d['price']}, qty={d['exec_qty']}, order_id={d['order_id']}")
+                elif topic == 'position':
+                    self.positions[d['symbol']] = Position.from_dict(d)
+        for s in symbols:
+            self._notify(s)
+
+    def __update_order(self, order: Order) -> None:
+        if order.order_status not in self.FINAL_STATUS:
+            self.orders[order.order_id] = order
+            return
+        self.orders.pop(order.order_id, None)
+        self.__finished[order.order_id] = order
+        self.__finished.move_to_end(order.order_id)
+        while len(self.__finished) > self.finished_capacity:
+            self.__finished.popitem(last=False)
@@ -0,0 +1,122 @@
+'''
+Retries and circuit breaking of api requests.
+
+A transient error is one after which the same request may succeed:
+a connection error or timeout, an http 429 or 5xx, or one of the
+RETRYABLE_RET_CODES. Other errors are answers of the exchange, which
+are raised at once and tell that the endpoint is healthy.
+'''
+from logging import getLogger
+from threading import Lock
+import random
+import time
+
+import requests
+
+from metrics import Counter
+
+
+logger = getLogger(__name__)
+
+
+RETRIES = Counter('bybit_retries_total', 'Bybit REST API requests retried after a transient error.', ('path',))
+HEDGED = Counter('bybit_hedged_requests_total', 'Duplicate reads sent because the first one was slow.', ('path',))
+CIRCUIT_OPENED = Counter('bybit_circuit_opened_total', 'Times the circuit of an endpoint was opened.', ('path',))
+
+RETRYABLE_RET_CODES = {10002, 10006, 10016}
+'''ret_code of request expired, too many visits and server error'''
+
+HEDGED_PATHS = {'/v2/public/orderBook/L2', '/v2/public/tickers'}
+'''public paths read with a duplicate request when the first one is slow'''
+
+
+def is_transient(e: Exception) -> bool:
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(e, requests.HTTPError):
+        return e.response is not None and (e.response.status_code == 429 or e.response.status_code >= 500)
+    return getattr(e, 'ret_code', None) in RETRYABLE_RET_CODES
+
+
+class RetryPolicy(object):
+    '''
+    Retries with exponential backoff and full jitter, so that the clients
+    retrying after the same outage do not hit the api at the same time.
+
+    Parameters
+    ----------
+    attempts: int
+        max number of attempts of a request including the first one
+    base: float
+        seconds of the backoff cap after the first attempt, doubled after each attempt
+    cap: float
+        max seconds of a backoff
+    budget: float
+        seconds after the first attempt in which a retry can be started
+    '''
+
+    def __init__(self, attempts: int = 3, base: float = 0.1, cap: float = 2.0, budget: float = 10.0):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.budget = budget
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+    def next_delay(self, attempt: int, elapsed: float) -> float:
+        '''
+        Returns
+        -------
+        float
+            seconds to wait before the retry after the attempt failed,
+            or None if the request should not be retried
+        '''
+        if attempt + 1 >= self.attempts:
+            return None
+        delay = self.delay(attempt)
+        return delay if elapsed + delay <= self.budget else None
+
+
+class CircuitBreaker(object):
+    '''
+    Fails requests of an endpoint at once after `threshold` transient
+    errors in a row, instead of making every caller wait for timeouts.
+    After `reset_after` seconds one request is let through, and its
+    success closes the circuit again.
+    '''
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.__lock = Lock()
+        self.__failures = {}
+        self.__opened = {}
+
+    def allow(self, path: str) -> bool:
+        with self.__lock:
+            opened = self.__opened.get(path)
+            if opened is None:
+                return True
+            if time.monotonic() - opened < self.reset_after:
+                return False
+            # half open, the next failure opens it again for another period
+            self.__opened[path] = time.monotonic()
+            return True
+
+    def is_open(self, path: str) -> bool:
+        return path in self.__opened
+
+    def success(self, path: str) -> None:
+        with self.__lock:
+            self.__failures.pop(path, None)
+            if self.__opened.pop(path, None) is not None:
+                logger.info(f'Closed circuit of {path}.')
+
+    def failure(self, path: str) -> None:
+        with self.__lock:
+            n = self.__failures[path] = self.__failures.get(path, 0) + 1
+            if n >= self.threshold and path not in self.__opened:
+                self.__opened[path] = time.monotonic()
+                CIRCUIT_OPENED.inc(path)
+                logger.warning(f'Opened circuit of {path} after {n} transient errors.')